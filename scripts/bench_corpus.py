@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线基准：在 record_fixtures.py 录下的样本页上，按分类计时 lib_cn.PARSERS（武器/防具含快速通道，
+ER_FAST_PATH=0 只测 parse_weapon/parse_armor 本身）和 write_md_by_data，
+输出每秒页数与 tracemalloc 峰值，并与基线 JSON 对比：解析吞吐掉得多或内存涨得多就以非零状态退出。
+判退化用的解析吞吐按校准折算：每轮计时前紧挨着跑一遍固定的纯 Python 工作量，记“每个校准单位解析几页”，
+机器快慢和一时的抢占在两者上同时体现、比值里抵掉，所以仓库里的基线换到 CI 机器上也能用；
+每秒页数只作参考。内存峰值与机器无关，直接比。
+
+用法:
+  python scripts/bench_corpus.py                         # 与 fixtures/bench_baseline.json 对比
+  python scripts/bench_corpus.py --save-baseline         # 以本次结果作为新基线
+  python scripts/bench_corpus.py --repeat 10 --tolerance 0.3 --fixtures fixtures
+基线与解析后端、Python 版本相关；改了样本或有意接受一次变慢时重新 --save-baseline 并提交。
+MD 写到临时目录，不碰仓库里的 items/。
+依赖: beautifulsoup4（可选 lxml）
+"""
+import argparse
+import gzip
+import math
+from html.parser import HTMLParser
+import os
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("ER_DOWNLOAD_ICONS", "0")
+
+import lib_cn
+from record_fixtures import FIXTURE_DIR, MANIFEST
+
+BASELINE = "bench_baseline.json"
+# 越大越好 / 越小越好的指标；每秒页数随机器变，写 MD 还受磁盘左右，只显示不判退化
+HIGHER_BETTER = ("parse_per_calib",)
+LOWER_BETTER = ("peak_kib",)
+# 每轮计时的最短时长（秒）
+ROUND_SECONDS = 0.2
+
+
+def load_corpus(root: pathlib.Path) -> dict[str, list[tuple[lib_cn.Page, str]]]:
+    """
+    {分类: [(页面, 来源)]}，页面以录制时的原始字节 + 编码喂给解析器，与线上抓取路径一致。
+    manifest 里标了 synthetic 的是手工按百科版式拼的页面，没有 URL，来源记成样本文件路径。
+    """
+    manifest = lib_cn.load_json(root / MANIFEST, None)
+    if not manifest:
+        sys.exit(f"没有样本：{root / MANIFEST} 不存在，先运行 scripts/record_fixtures.py")
+    corpus = {}
+    for cat, entries in manifest.items():
+        if cat not in lib_cn.PARSERS:
+            print(f"[warn] 未知分类 {cat}，跳过")
+            continue
+        pages = []
+        for e in entries:
+            body = gzip.decompress((root / e["file"]).read_bytes())
+            pages.append((lib_cn._page(body, e.get("encoding") or "utf-8"), e.get("url") or f"{root.name}/{e['file']}"))
+        if pages:
+            corpus[cat] = pages
+    return corpus
+
+
+def run_once(cat: str, pages, loops: int = 1) -> tuple[float, float]:
+    """解析并写出 loops 遍，返回每遍的 (解析秒数, 写 MD 秒数)。"""
+    parser = lib_cn.PARSERS[cat]
+    parse_s = write_s = 0.0
+    for _ in range(loops):
+        t0 = time.perf_counter()
+        results = [parser(page) for page, _url in pages]
+        t1 = time.perf_counter()
+        for data, (_page, url) in zip(results, pages):
+            lib_cn.write_md_by_data(data, url)
+        parse_s += t1 - t0
+        write_s += time.perf_counter() - t1
+    return parse_s / loops, write_s / loops
+
+
+def peak_kib(cat: str, pages) -> float:
+    """单独跑一轮量 tracemalloc 峰值（开着 tracemalloc 会拖慢，不与计时混在一起）。"""
+    tracemalloc.start()
+    try:
+        run_once(cat, pages)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+_CALIBRATION_HTML = "".join(f'<tr><td class="c{i % 7}"><a href="/w/{i}">条目{i}</a><br>{i * 3.5}</td></tr>'
+                            for i in range(2000))
+
+
+def calibrate() -> float:
+    """机器快慢的参照：用标准库 HTMLParser 扫一遍固定 HTML 的耗时（秒）。"""
+    t0 = time.perf_counter()
+    HTMLParser().feed(_CALIBRATION_HTML)
+    return time.perf_counter() - t0
+
+
+def bench(corpus, repeat: int) -> dict:
+    out = {}
+    for cat, pages in corpus.items():
+        warm = sum(run_once(cat, pages))              # 预热：正则编译、惰性导入等
+        # 样本少时单遍只有几毫秒，计时抖动比差异还大；每轮至少跑 ROUND_SECONDS
+        loops = max(1, math.ceil(ROUND_SECONDS / max(warm, 1e-6)))
+        rounds = [(calibrate(), *run_once(cat, pages, loops)) for _ in range(repeat)]
+        parse_s = statistics.median(r[1] for r in rounds)
+        write_s = statistics.median(r[2] for r in rounds)
+        out[cat] = {
+            "pages": len(pages),
+            # 两边都取最快的一轮：抢占只会让某一轮变慢，取最短才能在比值里抵掉
+            "parse_per_calib": round(len(pages) * min(r[0] for r in rounds) / min(r[1] for r in rounds), 3),
+            "parse_pps": round(len(pages) / parse_s, 2),
+            "write_pps": round(len(pages) / write_s, 2),
+            "peak_kib": round(peak_kib(cat, pages), 1),
+        }
+    return out
+
+
+def compare(current: dict, base: dict, tolerance: float) -> list[str]:
+    """返回退化描述；base 里没有的分类/指标不比。"""
+    bad = []
+    for cat, cur in current.items():
+        ref = base.get(cat)
+        if not ref:
+            continue
+        for key in HIGHER_BETTER:
+            if key in ref and cur[key] < ref[key] * (1 - tolerance):
+                bad.append(f"{cat}.{key}: {ref[key]} → {cur[key]}")
+        for key in LOWER_BETTER:
+            if key in ref and cur[key] > ref[key] * (1 + tolerance):
+                bad.append(f"{cat}.{key}: {ref[key]} → {cur[key]}")
+    return bad
+
+
+def fmt_delta(cur: float, ref: float | None) -> str:
+    return f"{(cur / ref - 1) * 100:+6.1f}%" if ref else "      -"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--fixtures", default=str(FIXTURE_DIR), help="样本目录（含 manifest.json）")
+    ap.add_argument("--baseline", help=f"基线 JSON，默认 <样本目录>/{BASELINE}")
+    ap.add_argument("--save-baseline", action="store_true", help="把本次结果写成基线，不做对比")
+    ap.add_argument("--repeat", type=int, default=5, help="每类计时轮数（取中位数）")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化，0.2 即 20%%")
+    args = ap.parse_args()
+
+    root = pathlib.Path(args.fixtures).resolve()
+    baseline_path = pathlib.Path(args.baseline).resolve() if args.baseline else root / BASELINE
+    corpus = load_corpus(root)
+    manifest = lib_cn.load_json(root / MANIFEST, {})
+    synthetic = sum(bool(e.get("synthetic")) for entries in manifest.values() for e in entries)
+    if synthetic:
+        print(f"[warn] {synthetic} 页是手工构造的样本（synthetic），不是录制的百科页面；"
+              f"能联网时用 scripts/record_fixtures.py 重录并 --save-baseline")
+
+    # write_md_by_data 写相对路径 items/<分类>/，切到临时目录
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="er-bench-") as tmp:
+        os.chdir(tmp)
+        try:
+            current = bench(corpus, max(1, args.repeat))
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "html_parser": lib_cn.html_parser_name(),
+        "fast_path": lib_cn.FAST_PATH,
+        "python": sys.version.split()[0],
+        "synthetic_pages": synthetic,
+        "categories": current,
+    }
+    if args.save_baseline:
+        lib_cn.save_json(baseline_path, report)
+        print(f"[done] 基线已写入 {baseline_path}")
+
+    saved = {} if args.save_baseline else lib_cn.load_json(baseline_path, {})
+    base = saved.get("categories", {})
+    if saved and (saved.get("html_parser"), saved.get("fast_path")) != (report["html_parser"], report["fast_path"]):
+        print(f"[warn] 基线的解析后端/快速通道设置与本次不同："
+              f"{saved.get('html_parser')}/{saved.get('fast_path')} vs {report['html_parser']}/{report['fast_path']}")
+
+    print(f"HTML 解析器: {report['html_parser']}，{args.repeat} 轮取中位数")
+    print(f"{'分类':<10}{'页数':>5}{'解析(页/校准)':>13}{'':>8}{'解析(页/秒)':>12}{'':>8}{'写MD(页/秒)':>12}{'':>8}"
+          f"{'峰值(KiB)':>11}{'':>8}")
+    for cat, cur in current.items():
+        ref = base.get(cat, {})
+        print(f"{cat:<10}{cur['pages']:>5}"
+              f"{cur['parse_per_calib']:>13.2f}{fmt_delta(cur['parse_per_calib'], ref.get('parse_per_calib')):>8}"
+              f"{cur['parse_pps']:>12.1f}{fmt_delta(cur['parse_pps'], ref.get('parse_pps')):>8}"
+              f"{cur['write_pps']:>12.1f}{fmt_delta(cur['write_pps'], ref.get('write_pps')):>8}"
+              f"{cur['peak_kib']:>11.1f}{fmt_delta(cur['peak_kib'], ref.get('peak_kib')):>8}")
+    print(lib_cn.fast_path_summary())
+
+    if args.save_baseline:
+        return
+    if not saved:
+        sys.exit(f"[fail] 没有基线 {baseline_path}：先用 --save-baseline 生成并提交")
+    bad = compare(current, base, args.tolerance)
+    for line in bad:
+        print(f"[fail] 退化超过 {args.tolerance:.0%}: {line}")
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
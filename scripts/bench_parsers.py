@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析器微基准：同一批真实页面上，对比“逐行 × 逐标签”旧扫描与 RowIndex 查表的耗时，
+并给出各分类解析器整页耗时。解析时不下载图标。
+
+用法:
+  python scripts/bench_parsers.py                       # 每类取目录页前 3 条在线页面（走 HTTP 缓存）
+  python scripts/bench_parsers.py --per 10 --repeat 50
+  python scripts/bench_parsers.py items:page.html spells:https://wiki.biligame.com/eldenring/...
+依赖: requests, beautifulsoup4（可选 lxml）
+"""
+import argparse
+import os
+import re
+import statistics
+import time
+
+os.environ.setdefault("ER_DOWNLOAD_ICONS", "0")
+
+import lib_cn
+from check_parsers import collect_targets, load_page
+
+
+# ---- 改动前的写法，原样抄在这里对照：lib_cn 里的 text_with_newlines 已改成按节点缓存、不改树，
+# 直接调用量到的就不是旧代码了 ----
+
+def legacy_text(tag) -> str:
+    """旧版 text_with_newlines：每次都把 <br> 换成换行再整段 get_text，不缓存。"""
+    if tag is None:
+        return ""
+    for br in tag.find_all("br"):
+        br.replace_with("\n")
+    txt = re.sub(r"[ \t]+", " ", tag.get_text("\n", strip=True))
+    return re.sub(r"\n{3,}", "\n\n", txt).strip()
+
+
+def legacy_block_after_title(rows, i, title_text) -> tuple[str, int]:
+    """旧版 extract_block_after_title。"""
+    txt = ""
+    if i < len(rows):
+        if legacy_text(rows[i]).strip() == title_text:
+            tds = rows[i+1].find_all("td") if i + 1 < len(rows) else []
+            if tds:
+                txt = legacy_text(tds[0])
+            return txt, i + 1
+    return txt, i
+
+
+def legacy_scan(table, fields, headers=()) -> dict:
+    """旧写法：逐行游标，每行先看表头行，再对每个候选标签调用 extract_block_after_title。"""
+    data = {}
+    rows = table.find_all("tr")
+    i = 0
+    while i < len(rows):
+        rtxt = legacy_text(rows[i])
+        if any(all(n in rtxt for n in h) for h in headers):
+            i += 1
+        for field, titles in fields:
+            for key in titles:
+                txt, i = legacy_block_after_title(rows, i, key)
+                if txt:
+                    data[field] = txt
+        i += 1
+    return data
+
+
+def indexed_scan(table, fields, headers=()) -> dict:
+    return lib_cn.RowIndex(table, fields, headers).fill({}, fields)
+
+
+def median_time(fn, repeat: int, setup=None) -> float:
+    """重复 repeat 次取中位数（秒）；setup 的耗时不计入，其返回值传给 fn。"""
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("pages", nargs="*", help="<分类>:<文件或URL>，文件可为 .html 或 .html.gz")
+    ap.add_argument("--per", type=int, default=3, help="未指定页面时每类取几条")
+    ap.add_argument("--repeat", type=int, default=20, help="每项重复次数")
+    args = ap.parse_args()
+
+    print(f"HTML 解析器: {lib_cn.html_parser_name()}")
+    print(f"{'分类':<10}{'行数':>5}{'旧扫描(ms)':>12}{'查表(ms)':>10}{'加速':>7}{'整页(ms)':>10}  页面")
+    total_old = total_new = 0.0
+    for cat, src in collect_targets(args.pages, args.per):
+        html = load_page(src)
+        full = median_time(lambda _: lib_cn.PARSERS[cat](html), args.repeat)
+        fields = lib_cn.ROW_FIELDS.get(cat)
+        headers = lib_cn.ROW_HEADERS.get(cat, ())
+        # 文本按节点缓存，每次计时都换一棵新树，免得后一轮吃到前一轮的缓存
+        fresh_table = lambda: lib_cn.make_soup(html).select_one(".mw-parser-output table.wikitable")
+        table = fresh_table()
+        if not fields or table is None:
+            print(f"{cat:<10}{'-':>5}{'-':>12}{'-':>10}{'-':>7}{full * 1e3:>10.2f}  {src}")
+            continue
+        if legacy_scan(fresh_table(), fields, headers) != indexed_scan(table, fields, headers):
+            print(f"[warn] {cat} {src}: 旧扫描与查表结果不同")
+        old = median_time(lambda t: legacy_scan(t, fields, headers), args.repeat, fresh_table)
+        new = median_time(lambda t: indexed_scan(t, fields, headers), args.repeat, fresh_table)
+        total_old += old
+        total_new += new
+        rows = len(table.find_all("tr"))
+        print(f"{cat:<10}{rows:>5}{old * 1e3:>12.2f}{new * 1e3:>10.2f}{old / new:>6.1f}x{full * 1e3:>10.2f}  {src}")
+    if total_new:
+        print(f"合计: 旧扫描 {total_old * 1e3:.2f} ms，查表 {total_new * 1e3:.2f} ms，{total_old / total_new:.1f}x")
+    print(lib_cn.fast_path_summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对拍各分类解析器：同一页面分别用 lxml 与 html.parser、整页与局部（只建标题和正文区）建树，
+以及武器/防具的流式快速通道，抽出来的字典必须完全一致。
+lib_cn 与 fetch_samples_all_categories 两套 PARSERS 都会检查；解析时不下载图标。
+
+用法:
+  python scripts/check_parsers.py                      # 每类取目录页前 3 条在线页面（走 HTTP 缓存）
+  python scripts/check_parsers.py --per 10
+  python scripts/check_parsers.py weapons:page.html armors:https://wiki.biligame.com/eldenring/...
+有差异时逐字段打印，并以非零状态退出。
+依赖: requests, beautifulsoup4, lxml
+"""
+import argparse
+import gzip
+import os
+import sys
+
+os.environ.setdefault("ER_DOWNLOAD_ICONS", "0")
+
+import lib_cn
+import fetch_samples_all_categories as samples
+
+BACKENDS = ("html.parser", "lxml")
+
+
+def load_page(src: str) -> str:
+    if src.startswith(("http://", "https://")):
+        return lib_cn.get_html(src)
+    opener = gzip.open if src.endswith(".gz") else open
+    with opener(src, "rt", encoding="utf-8") as f:
+        return f.read()
+
+
+def collect_targets(specs: list[str], per: int) -> list[tuple[str, str]]:
+    """[(分类, 文件或 URL)]；没给参数时从各分类目录页取前 per 条。"""
+    if specs:
+        out = []
+        for spec in specs:
+            cat, _, src = spec.partition(":")
+            if cat not in lib_cn.PARSERS or not src:
+                sys.exit(f"参数格式应为 <分类>:<文件或URL>，分类可选 {', '.join(lib_cn.PARSERS)}：{spec}")
+            out.append((cat, src))
+        return out
+    out = []
+    for cat, index_url in samples.INDEX.items():
+        out += [(cat, url) for _name, url, _title in samples.pick_first_unique(index_url, per)]
+    return out
+
+
+def diff_dicts(a: dict, b: dict) -> list[str]:
+    return [k for k in sorted(set(a) | set(b)) if a.get(k) != b.get(k)]
+
+
+def run_variants(html: str, parser, variants) -> dict:
+    """对同一页面按每个变体的设置各跑一次解析器，返回 {变体名: dict}。"""
+    out = {}
+    for label, setup in variants:
+        setup()
+        out[label] = parser(html)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("pages", nargs="*", help="<分类>:<文件或URL>，文件可为 .html 或 .html.gz")
+    ap.add_argument("--per", type=int, default=3, help="未指定页面时每类取几条")
+    args = ap.parse_args()
+
+    if lib_cn._resolve_parser("auto") != "lxml":
+        sys.exit("需要安装 lxml 才能对拍：pip install lxml")
+    variants = [
+        (f"{name}/{'局部' if partial else '整页'}",
+         lambda name=name, partial=partial: (lib_cn.set_html_parser(name), lib_cn.set_partial_parse(partial),
+                                             lib_cn.set_fast_path(False)))
+        for name in BACKENDS for partial in (False, True)
+    ]
+    variants.append(("快速通道", lambda: lib_cn.set_fast_path(True)))
+
+    failures = checked = 0
+    for cat, src in collect_targets(args.pages, args.per):
+        html = load_page(src)
+        for suite, parsers in (("lib_cn", lib_cn.PARSERS), ("samples", samples.PARSERS)):
+            results = run_variants(html, parsers[cat], variants)
+            checked += 1
+            base_label, base = variants[0][0], results[variants[0][0]]
+            for label, data in results.items():
+                keys = diff_dicts(base, data)
+                if not keys:
+                    continue
+                failures += 1
+                print(f"[diff] {suite}.{cat} {src}: {base_label} vs {label}")
+                for k in keys:
+                    print(f"  {k}:\n    {base.get(k)!r}\n    {data.get(k)!r}")
+    print(f"{checked} 次对拍，{failures} 处不一致；{lib_cn.fast_path_summary()}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,41 +11,20 @@
 import os
 import re
 import sys
-import time
 import pathlib
 from urllib.parse import urljoin, urlparse, parse_qs, unquote
 
-import requests
-from bs4 import BeautifulSoup
+from lib_cn import (
+    SYNC, fetch_icon, find_left_td, get_html, iter_content_links, make_page_soup, scan_info_table,
+    text_with_newlines,
+)
 
 # -------------------- 配置 --------------------
 INDEX_URL = "https://wiki.biligame.com/eldenring/%E6%AD%A6%E5%99%A8%E4%B8%80%E8%A7%88"
 LIMIT = 3
-DELAY = 0.8
-HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) ER-Items-Fetch/1.4"}
 BAD_PREFIXES = ("特殊:", "分类:", "Category:", "模板", "Template:", "文件:", "File:", "MediaWiki:", "帮助:", "Help:")
 
 # -------------------- HTTP & HTML --------------------
-def get_html(url: str, timeout: float = 25.0) -> str:
-    r = requests.get(url, headers=HEADERS, timeout=timeout)
-    r.raise_for_status()
-    if not r.encoding or r.encoding.lower() == "iso-8859-1":
-        r.encoding = r.apparent_encoding or "utf-8"
-    return r.text
-
-def soup_of(url: str) -> BeautifulSoup:
-    return BeautifulSoup(get_html(url), "html.parser")
-
-def text_with_newlines(tag) -> str:
-    if tag is None:
-        return ""
-    for br in tag.find_all("br"):
-        br.replace_with("\n")
-    txt = tag.get_text("\n", strip=True)
-    txt = re.sub(r"[ \t]+", " ", txt)
-    txt = re.sub(r"\n{3,}", "\n\n", txt).strip()
-    return txt
-
 def pair_by_sequence(strings):
     out, it = {}, iter(strings)
     for k in it:
@@ -94,11 +73,8 @@ def is_item_link(href: str) -> bool:
 
 def pick_first_n_items_unique(index_url: str, n: int = 3):
     base = "{u.scheme}://{u.netloc}".format(u=urlparse(index_url))
-    soup = soup_of(index_url)
-    content = soup.select_one("#mw-content-text .mw-parser-output") or soup.select_one(".mw-parser-output") or soup
     found, seen_titles = [], set()
-    for a in content.find_all("a", href=True):
-        href = a["href"]
+    for href, text in iter_content_links(get_html(index_url)):   # 流式解析，拿够 n 条即停
         if not is_item_link(href):
             continue
         title = parse_title_from_href(href).strip()
@@ -106,7 +82,7 @@ def pick_first_n_items_unique(index_url: str, n: int = 3):
             continue
         seen_titles.add(title)
         url = urljoin(base, href)
-        name = a.get_text(strip=True) or title
+        name = text or title
         found.append((name, url, title))
         if len(found) >= n:
             break
@@ -116,35 +92,18 @@ def pick_first_n_items_unique(index_url: str, n: int = 3):
 def extract_fp_weight_and_lines(table) -> tuple[str, str, list]:
     """
     从信息卡左侧单元格解析“类型行”，并提取 FP/重量。
-    - 为了不把右侧浮动的数值（3（-/-）、3.5 等）当成类型行，先把 style 含 'float:right' 的节点删掉
+    - 为了不把右侧浮动的数值（3（-/-）、3.5 等）当成类型行，遍历时跳过 style 含 'float:right' 的节点
     - 类型行里去掉“消耗专注值/重量”标签行，只保留武器种类/攻击形态/战技名等
     - FP/重量本身从整表文本兜底解析，保证能拿到数值
     """
     fp = wt = ""
-    lines = []
-
-    # 复制一份左 td 的 HTML，再在副本上删除右浮动数值节点
-    left_td = None
-    for tr in table.find_all("tr"):
-        tds = tr.find_all("td")
-        if len(tds) == 2 and len(list(tds[0].stripped_strings)) >= 2:
-            left_td = tds[0]
-            break
 
-    if left_td:
-        left_clone = BeautifulSoup(str(left_td), "html.parser")
-        # 删除右浮动的数字块
-        for n in left_clone.select('[style*="float:right"]'):
-            n.decompose()
-        # 得到干净的行
-        raw_lines = [ln.strip() for ln in text_with_newlines(left_clone).splitlines() if ln.strip()]
-        for ln in raw_lines:
-            if ln.startswith("消耗专注值") or ln.startswith("重量"):
-                continue  # 标签行去掉（真正的数值我们单独解析）
-            lines.append(ln)
+    # 一次遍历整表：左 td 的行原地跳过右浮动数值块，不复制、不重新建树；整表文本顺带得到
+    full, raw_lines = scan_info_table(table, find_left_td(table, min_strings=2))
+    # 标签行去掉（真正的数值我们单独解析）
+    lines = [ln for ln in raw_lines if not (ln.startswith("消耗专注值") or ln.startswith("重量"))]
 
     # 从整表文本兜底解析 FP / 重量
-    full = text_with_newlines(table)
     m = re.search(r"消耗专注值\s*([^\n\r]+)", full)
     if m:
         fp = m.group(1).strip()
@@ -159,7 +118,7 @@ def extract_fp_weight_and_lines(table) -> tuple[str, str, list]:
     return fp, wt, lines
 
 def parse_item_html(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = {}
 
     # 标题
@@ -257,50 +216,14 @@ def parse_item_html(html: str) -> dict:
 def safe_filename(name: str) -> str:
     return re.sub(r"[\\/<>:\"|?*]+", "_", name).strip() or "unknown"
 
-def try_download(url: str) -> bytes | None:
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=25)
-        r.raise_for_status()
-        return r.content
-    except Exception:
-        return None
-
 def download_image(url: str, out_dir: pathlib.Path) -> str:
     """优先原始 src；若带 /80px-/120px-/160px-，尝试 120/160/80 回退。"""
     out_dir.mkdir(parents=True, exist_ok=True)
     if not url:
         return ""
     u = ("https:" + url) if url.startswith("//") else url
-    candidates = [u]
-    m = re.search(r"/(\d+)px-", u)
-    if m:
-        size_tag = m.group(1)
-        for sz in ["120", "160", "80"]:
-            if sz != size_tag:
-                candidates.append(u.replace(f"/{size_tag}px-", f"/{sz}px-"))
-    for uu in candidates:
-        content = try_download(uu)
-        if content:
-            ext = os.path.splitext(urlparse(uu).path)[1] or ".png"
-            p = out_dir / f"icon{ext}"
-            with open(p, "wb") as f:
-                f.write(content)
-            return str(p)
-    return ""
-
-def wipe_repo_except(keep: list[str]):
-    root = pathlib.Path(".")
-    for p in root.iterdir():
-        if p.name in keep or p.name == ".git":
-            continue
-        if p.is_dir():
-            import shutil
-            shutil.rmtree(p, ignore_errors=True)
-        else:
-            try:
-                p.unlink()
-            except Exception:
-                pass
+    p = fetch_icon(u, out_dir, sizes=("120", "160", "80"), revalidate=True)
+    return str(p) if p else ""
 
 def md_table_from_pairs(title: str, kv: dict) -> str:
     """表格列左对齐：|:---|:---|"""
@@ -317,10 +240,11 @@ def hardbreak_block(lines: list[str]) -> str:
     lines = [ln for ln in lines if ln is not None and ln != ""]
     return "  \n".join(lines)
 
-def write_repo(items: list[dict]):
-    # 清空（保留 .github 与 scripts）
-    wipe_repo_except([".github", "scripts"])
-
+def write_repo(items: list[dict], prune: bool = True):
+    """
+    增量写入：不再清空仓库，图标只下新增/变化的；prune=True（本轮全部成功）时
+    最后删掉 items/weapons 与 assets/weapons 下不再引用的孤儿文件。
+    """
     root = pathlib.Path(".")
     (root / "README.md").write_text(
         "# 艾尔登法环 · 物品手册（演示样例）\n\n- 目录： [武器（样例）](items/weapons/README.md)\n",
@@ -333,6 +257,7 @@ def write_repo(items: list[dict]):
     for it in items:
         lines.append(f"- [{it['name']}](./{safe_filename(it['name'])}.md)")
     (md_root / "README.md").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    SYNC.keep(md_root / "README.md")
 
     # 写每个物品 MD + 本地图片
     for it in items:
@@ -387,6 +312,7 @@ def write_repo(items: list[dict]):
             body.append(f"**武器使用强化石类型**：{it['upgrade']}\n")
 
         (md_root / f"{slug}.md").write_text("\n".join(body), encoding="utf-8")
+        SYNC.keep(md_root / f"{slug}.md")
 
     # 集中署名（低调）
     (root / "ATTRIBUTION.md").write_text(
@@ -394,6 +320,9 @@ def write_repo(items: list[dict]):
         encoding="utf-8",
     )
 
+    if prune:
+        SYNC.prune([md_root, root / "assets" / "weapons"])
+
 # -------------------- 主流程 --------------------
 def main():
     try:
@@ -415,9 +344,8 @@ def main():
             results.append(data)
         except Exception as e:
             sys.stderr.write(f"[warn] 解析失败：{name} -> {url} -> {e}\n")
-        time.sleep(DELAY)
 
-    write_repo(results)
+    write_repo(results, prune=len(results) == len(triples))
 
 if __name__ == "__main__":
     main()
@@ -15,19 +15,30 @@
 import os
 import re
 import sys
-import time
 import json
-import shutil
+import time
+import argparse
 import pathlib
+import threading
+import multiprocessing
+import tracemalloc
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from urllib.parse import urljoin, urlparse, parse_qs, unquote
 
-import requests
-from bs4 import BeautifulSoup
+from lib_cn import (
+    CACHE_DIR, HTML_PARSER, HTML_PARSERS, MW_BATCH, STATE_FILE, STATS, SYNC, CardRows, Journal, MemoryProfiler,
+    RowIndex, TraceRecorder, fast_path_stats, fast_path_summary, fetch_icon, file_size, find_left_td, get_html,
+    get_page, html_parser_name, iter_content_links, load_json, make_page_soup, measure_alloc, merge_fast_stats,
+    mw_query_pages, peak_rss_kib, save_json, scan_info_card, scan_info_table, set_html_parser, set_partial_parse,
+    staged, take_fast_stats, text_with_newlines, wipe_repo_except, with_fast_path,
+)
 
-HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) ER-Items-Fetch/2.5"}
-DELAY = float(os.getenv("ER_FETCH_DELAY", "0.7"))   # 默认 0.7s，可被 Actions 传参覆盖
 PER_CAT = int(os.getenv("ER_FETCH_PER", "3"))       # 每类抓取条数
-TIMEOUT = 25.0
+CONCURRENCY = int(os.getenv("ER_FETCH_CONCURRENCY", "4"))   # 同时在途的请求数；平均速率由 lib_cn 按 ER_FETCH_DELAY 限制
+PARSE_WORKERS = int(os.getenv("ER_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))   # 解析进程数；0 = 在抓取线程里解析
+RUN_REPORT = os.getenv("ER_RUN_REPORT", "")        # 运行报告 JSON 路径；空 = 不统计
+TRACE_FILE = os.getenv("ER_TRACE", "")             # Chrome trace 事件 JSON 路径；空 = 不记录
+MEMORY_FILE = str(CACHE_DIR / "memory_profile.json")   # --profile-memory 不带路径时的输出位置
 
 # 各分类目录页
 INDEX = {
@@ -44,26 +55,6 @@ BAD_PREFIXES = ("特殊:", "分类:", "Category:", "模板", "Template:", "文
 BAD_TITLES = set(["首页","武器一览","防具一览","护符一览","物品一览","法术一览","战灰一览"])
 
 # ---------- 基础工具 ----------
-def get_html(url: str) -> str:
-    r = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
-    r.raise_for_status()
-    if not r.encoding or r.encoding.lower() == "iso-8859-1":
-        r.encoding = r.apparent_encoding or "utf-8"
-    return r.text
-
-def soup_of(url: str) -> BeautifulSoup:
-    return BeautifulSoup(get_html(url), "html.parser")
-
-def text_with_newlines(tag) -> str:
-    if tag is None:
-        return ""
-    for br in tag.find_all("br"):
-        br.replace_with("\n")
-    txt = tag.get_text("\n", strip=True)
-    txt = re.sub(r"[ \t]+", " ", txt)
-    txt = re.sub(r"\n{3,}", "\n\n", txt).strip()
-    return txt
-
 def parse_title_from_href(href: str) -> str:
     if "/index.php" in href:
         return unquote(parse_qs(urlparse(href).query).get("title", [""])[0])
@@ -79,24 +70,26 @@ def is_item_link(href: str) -> bool:
         return False
     return bool(title.strip())
 
-def pick_first_unique(index_url: str, n: int) -> list[tuple[str,str,str]]:
+def iter_first_unique(index_url: str, n: int | None):
+    """边流式解析目录页边产出 (名字, URL, 标题)，名字去重；拿够 n 条即停，n=None 表示整页全部条目（--all）。"""
+    if n is not None and n <= 0:
+        return
     base = "{u.scheme}://{u.netloc}".format(u=urlparse(index_url))
-    soup = soup_of(index_url)
-    content = soup.select_one("#mw-content-text .mw-parser-output") or soup.select_one(".mw-parser-output") or soup
-    found, seen = [], set()
-    for a in content.find_all("a", href=True):
-        href = a["href"]
+    seen = set()
+    for href, text in iter_content_links(get_html(index_url)):
         if not is_item_link(href):
             continue
         title = parse_title_from_href(href).strip()
-        name = a.get_text(strip=True) or title
+        name = text or title
         if not name or name in seen:
             continue
         seen.add(name)
-        found.append((name, urljoin(base, href), title))
-        if len(found) >= n:
-            break
-    return found
+        yield name, urljoin(base, href), title
+        if n is not None and len(seen) >= n:
+            return
+
+def pick_first_unique(index_url: str, n: int | None) -> list[tuple[str,str,str]]:
+    return list(iter_first_unique(index_url, n))
 
 # ---------- 解析公共 ----------
 def pair_by_sequence(strings) -> dict:
@@ -133,35 +126,19 @@ def remove_orphan_numbers(lines: list[str], *numbers: str) -> list[str]:
 def extract_image_from_table(table) -> str:
     # 优先 .img-equip；否则取首个 <img>
     img = table.select_one("img.img-equip") or table.select_one("img")
-    if img and img.get("src"):
-        src = img["src"]
-        return ("https:" + src) if src.startswith("//") else src
-    return ""
+    return absolute_src(img.get("src") or "") if img else ""
+
+def absolute_src(src: str) -> str:
+    return ("https:" + src) if src.startswith("//") else src
 
+@staged("icon", lambda path, *_: file_size(path))
 def download_image(url: str, out_dir: pathlib.Path) -> str:
     out_dir.mkdir(parents=True, exist_ok=True)
     if not url:
         return ""
     u = ("https:" + url) if url.startswith("//") else url
-    cands = [u]
-    m = re.search(r"/(\d+)px-", u)
-    if m:
-        tag = m.group(1)
-        for sz in ("160","120","80"):
-            if sz != tag:
-                cands.append(u.replace(f"/{tag}px-", f"/{sz}px-"))
-    for uu in cands:
-        try:
-            r = requests.get(uu, headers=HEADERS, timeout=TIMEOUT)
-            r.raise_for_status()
-            ext = os.path.splitext(urlparse(uu).path)[1] or ".png"
-            p = out_dir / f"icon{ext}"
-            with open(p, "wb") as f:
-                f.write(r.content)
-            return str(p)
-        except Exception:
-            continue
-    return ""
+    p = fetch_icon(u, out_dir, revalidate=True)
+    return str(p) if p else ""
 
 def md_table(title: str, kv: dict) -> str:
     if not kv:
@@ -181,33 +158,23 @@ def safe_slug(name: str) -> str:
 
 # ---------- 针对不同大类的解析器 ----------
 def parse_weapon(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = ensure_dict({}, soup.select_one("h1.firstHeading").get_text(strip=True) if soup.select_one("h1.firstHeading") else "")
     table = soup.select_one(".mw-parser-output table.wikitable")
     if not table:
         return data
+    # 一次遍历：整表文本 + 左栏类型行（原地跳过右浮动数值）
+    whole, raw = scan_info_table(table, find_left_td(table, min_strings=2))
+    return _weapon_fields(data, RowIndex(table), whole, raw, extract_image_from_table(table))
 
-    whole = text_with_newlines(table)
+def _weapon_fields(data: dict, idx: RowIndex, whole: str, raw: list[str], image: str) -> dict:
+    """武器信息卡各字段；BeautifulSoup 与快速通道共用（idx 可以是 RowIndex 或 CardRows）。"""
     quality = ""
     m = re.search(r"武器品质[:：]?\s*([^\s\n]+)", whole)
     if m: quality = m.group(1).strip()
 
-    # 左栏类型行（去掉右浮动数值）
-    left_td = None
-    for tr in table.find_all("tr"):
-        tds = tr.find_all("td")
-        if len(tds) == 2 and len(list(tds[0].stripped_strings)) >= 2:
-            left_td = tds[0]; break
-    lines = []
+    lines = [ln for ln in raw if not (ln.startswith("消耗专注值") or ln.startswith("重量"))]
     fp = wt = ""
-    if left_td:
-        left = BeautifulSoup(str(left_td), "html.parser")
-        for n in left.select('[style*="float:right"]'): n.decompose()
-        raw = [s.strip() for s in text_with_newlines(left).splitlines() if s.strip()]
-        for ln in raw:
-            if ln.startswith("消耗专注值") or ln.startswith("重量"):
-                continue
-            lines.append(ln)
 
     # FP/重量兜底
     m = re.search(r"消耗专注值\s*([^\n\r]+)", whole)
@@ -217,14 +184,13 @@ def parse_weapon(html: str) -> dict:
     lines = remove_orphan_numbers(lines, fp, wt)
 
     data["header_lines"] = [f"武器品质: {quality}", *lines, f"消耗专注值 {fp}".strip(), f"重量 {wt}".strip()]
-    data["image"] = extract_image_from_table(table)
+    data["image"] = image
 
     # 四块表 + 附加信息
-    rows = table.find_all("tr")
     i = 0
-    def row(i): return rows[i].find_all("td") if 0 <= i < len(rows) else []
-    while i < len(rows):
-        rtxt = text_with_newlines(rows[i])
+    row, cell_text = idx.tds, idx.cell_text
+    while i < len(idx.texts):
+        rtxt = idx.texts[i]
 
         if "攻击力" in rtxt and "减伤率" in rtxt:
             t2 = row(i+1)
@@ -242,38 +208,47 @@ def parse_weapon(html: str) -> dict:
 
         if rtxt.strip()=="附加效果":
             t2 = row(i+1)
-            if t2: data["sections"]["附加效果"] = text_with_newlines(t2[0]); i += 1
+            if t2: data["sections"]["附加效果"] = cell_text(t2[0]); i += 1
 
         if rtxt.strip()=="简介":
             t2 = row(i+1)
-            if t2: data["sections"]["简介"] = text_with_newlines(t2[0]); i += 1
+            if t2: data["sections"]["简介"] = cell_text(t2[0]); i += 1
 
         if rtxt.strip()=="获取地点":
             t2 = row(i+1)
-            if t2: data["sections"]["获取地点"] = text_with_newlines(t2[0]); i += 1
+            if t2: data["sections"]["获取地点"] = cell_text(t2[0]); i += 1
 
         if rtxt.strip().startswith("专属战技"):
             m = re.match(r"专属战技[-：:]\s*(.+)", rtxt.strip())
             if m: data["sections"]["专属战技"] = m.group(1).strip()
             t2 = row(i+1)
-            if t2: data["sections"]["专属战技说明"] = text_with_newlines(t2[0]); i += 1
+            if t2: data["sections"]["专属战技说明"] = cell_text(t2[0]); i += 1
 
         if rtxt.strip()=="武器使用强化石类型":
             t2 = row(i+1)
-            if t2: data["sections"]["武器使用强化石类型"] = text_with_newlines(t2[0]); i += 1
+            if t2: data["sections"]["武器使用强化石类型"] = cell_text(t2[0]); i += 1
 
         i += 1
 
     return data
 
 def parse_armor(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = ensure_dict({}, soup.select_one("h1.firstHeading").get_text(strip=True) if soup.select_one("h1.firstHeading") else "")
     table = soup.select_one(".mw-parser-output table.wikitable")
     if not table:
         return data
-    whole = text_with_newlines(table)
-    data["image"] = extract_image_from_table(table)
+    # 在很多页面紧邻图片下会有简介文本块，直接从页面全局抓
+    right_desc = soup.select_one(".mw-parser-output p")
+    para = right_desc.get_text(" ", strip=True) if right_desc else None
+    return _armor_fields(data, RowIndex(table), text_with_newlines(table), extract_image_from_table(table), para)
+
+# 防具卡里“标题行 + 下一行正文”的标题；旧写法直接取 parts[i+1]，标题在最后一行时会越界
+ARMOR_TITLES = ("减伤率", "抵抗力", "获取途径")
+
+def _armor_fields(data: dict, idx: RowIndex, whole: str, image: str, para: str | None) -> dict:
+    """防具信息卡各字段；BeautifulSoup 与快速通道共用。para 为正文区第一个段落的文字。"""
+    data["image"] = image
 
     # 重量
     wt = ""
@@ -282,37 +257,51 @@ def parse_armor(html: str) -> dict:
     data["header_lines"] = [f"重量 {wt}"]
 
     # 左列两块表（减伤率 / 抵抗力）
-    parts = table.find_all("tr")
-    # 尝试找“减伤率”“抵抗力”标题所在的两个表
     kvt = {}
-    for i, tr in enumerate(parts):
-        t = text_with_newlines(tr).strip()
+    for i, rtxt in enumerate(idx.texts):
+        t = rtxt.strip()
+        if t in ARMOR_TITLES and i + 1 >= len(idx.texts):
+            raise IndexError("list index out of range")
         if t=="减伤率":
-            t2 = parts[i+1].find_all("td")
+            t2 = idx.tds(i+1)
             if t2: kvt["减伤率"] = pair_by_sequence(list(t2[0].stripped_strings))
         if t=="抵抗力":
-            t2 = parts[i+1].find_all("td")
+            t2 = idx.tds(i+1)
             if t2: kvt["抵抗力"] = pair_by_sequence(list(t2[0].stripped_strings))
     data["kv_tables"].update(kvt)
 
-    # 获取途径 + 右侧简介
-    # 许多页面“获取途径”是独立段落
-    for i, tr in enumerate(parts):
-        t = text_with_newlines(tr).strip()
-        if t=="获取途径":
-            t2 = parts[i+1].find_all("td")
-            if t2: data["sections"]["获取途径"] = text_with_newlines(t2[0])
+    # 获取途径：许多页面是独立段落
+    for i, rtxt in enumerate(idx.texts):
+        if rtxt.strip()=="获取途径":
+            t2 = idx.tds(i+1)
+            if t2: data["sections"]["获取途径"] = idx.cell_text(t2[0])
     # 右侧说明块
-    # 在很多页面紧邻图片下会有简介文本块，直接从页面全局抓
-    right_desc = soup.select_one(".mw-parser-output p")
-    if right_desc:
-        para = right_desc.get_text(" ", strip=True)
-        if para:
-            data["sections"].setdefault("说明", para)
+    if para:
+        data["sections"].setdefault("说明", para)
     return data
 
+def fast_parse_weapon(html: str) -> dict | None:
+    """流式抽标题和信息卡（lib_cn.scan_info_card），字段同 parse_weapon；自检不过返回 None。"""
+    sc = scan_info_card(html)
+    if sc is None:
+        return None
+    rows = CardRows(sc.rows)
+    data = ensure_dict({}, "".join(sc.name_pieces))
+    return _weapon_fields(data, rows, sc.table_text, rows.left_lines(min_strings=2), absolute_src(sc.icon_src))
+
+def fast_parse_armor(html: str) -> dict | None:
+    """同上，另带正文区第一个段落；字段同 parse_armor。"""
+    sc = scan_info_card(html, want_para=True)
+    if sc is None:
+        return None
+    rows = CardRows(sc.rows)
+    if rows.texts and rows.texts[-1].strip() in ARMOR_TITLES:
+        return None           # 交给 parse_armor 按旧行为报错
+    data = ensure_dict({}, "".join(sc.name_pieces))
+    return _armor_fields(data, rows, sc.table_text, absolute_src(sc.icon_src), sc.para_text)
+
 def parse_talisman(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = ensure_dict({}, soup.select_one("h1.firstHeading").get_text(strip=True) if soup.select_one("h1.firstHeading") else "")
     table = soup.select_one(".mw-parser-output table.wikitable")
     if not table:
@@ -341,7 +330,7 @@ def parse_talisman(html: str) -> dict:
     return data
 
 def parse_item(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = ensure_dict({}, soup.select_one("h1.firstHeading").get_text(strip=True) if soup.select_one("h1.firstHeading") else "")
     table = soup.select_one(".mw-parser-output table.wikitable")
     if not table:
@@ -377,7 +366,7 @@ def parse_item(html: str) -> dict:
     return data
 
 def parse_spell(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = ensure_dict({}, soup.select_one("h1.firstHeading").get_text(strip=True) if soup.select_one("h1.firstHeading") else "")
     # 法术页面右侧一般有一张参数表
     table = None
@@ -425,7 +414,7 @@ def parse_spell(html: str) -> dict:
     return data
 
 def parse_ash(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = ensure_dict({}, soup.select_one("h1.firstHeading").get_text(strip=True) if soup.select_one("h1.firstHeading") else "")
     table = soup.select_one(".mw-parser-output table.wikitable")
     if table:
@@ -453,9 +442,11 @@ def parse_ash(html: str) -> dict:
         data["sections"].setdefault("说明", "\n".join(right_ps[:2]))
     return data
 
+# 武器/防具只用到标题和信息卡（防具再加一个段落），先走流式快速通道，自检不过回退 BeautifulSoup；
+# 命中数见 fast_path_summary()，ER_FAST_PATH=0 关掉
 PARSERS = {
-    "weapons": parse_weapon,
-    "armors": parse_armor,
+    "weapons": with_fast_path("weapons", fast_parse_weapon, parse_weapon),
+    "armors": with_fast_path("armors", fast_parse_armor, parse_armor),
     "talismans": parse_talisman,
     "items": parse_item,
     "spells": parse_spell,
@@ -463,111 +454,389 @@ PARSERS = {
 }
 
 # ---------- 写入仓库 ----------
-def wipe_repo_except(keep: list[str]):
-    root = pathlib.Path(".")
-    for p in list(root.iterdir()):
-        if p.name in keep or p.name == ".git":
-            continue
-        if p.is_dir():
-            shutil.rmtree(p, ignore_errors=True)
-        else:
-            try: p.unlink()
-            except Exception: pass
+ZH_NAMES = {
+    "weapons":"武器","armors":"防具","talismans":"护符",
+    "items":"物品","spells":"法术","ashes":"战灰",
+}
 
-def write_repo(all_data: dict):
+def write_item(cat: str, it: dict) -> pathlib.Path:
+    """单个条目：下载图标 + 写 Markdown（抓完一条写一条，便于断点续跑），返回 Markdown 路径。
+    图标另记在 icon 阶段，write 阶段只算拼 Markdown 和落盘。"""
+    root = pathlib.Path(".")
+    md_root = root/"items"/cat
+    md_root.mkdir(parents=True, exist_ok=True)
+
+    slug = safe_slug(it["name"])
+    assets_dir = root/"assets"/cat/slug
+    rel = ""
+    img_path = download_image(it.get("image",""), assets_dir)
+    if img_path:
+        rel_path = os.path.relpath(img_path, md_root)
+        rel = rel_path.replace(os.sep, "/")  # 避免 f-string 里写反斜杠
+
+    md_path = md_root/f"{slug}.md"
+    with STATS.stage("write") as span:
+        body = [f"# {it['name']}"]
+        if rel:
+            body.append(f"![icon]({rel})")
+        body.append("")
+        if it.get("header_lines"):
+            body.append(hardbreak(it["header_lines"]))
+            body.append("")
+        # 表格
+        for title, kv in it.get("kv_tables", {}).items():
+            body.append(md_table(title, kv))
+        # 段落
+        for title, txt in it.get("sections", {}).items():
+            if title in ("简介","说明"):
+                block = "> " + "\n> ".join(txt.splitlines())
+                body.append(block + "\n")
+            else:
+                body.append(f"**{title}**：{txt}\n")
+
+        # 低调署名（合规必须）
+        source = it.get("source","")
+        if source:
+            body.append(f"> 来源：本文整合自公开百科页面（保留署名以符合 CC BY-NC-SA 4.0）。\n> {source}")
+
+        md_path.write_text("\n".join(body), encoding="utf-8")
+        span.bytes = file_size(md_path)
+    SYNC.keep(md_path)
+    return md_path
+
+def keep_item(cat: str, it: dict):
+    """断点续跑时跳过重写的条目：它的 Markdown 与图标目录同样不算孤儿。"""
+    slug = safe_slug(it["name"])
+    SYNC.keep(pathlib.Path("items")/cat/f"{slug}.md")
+    SYNC.keep(pathlib.Path("assets")/cat/slug)
+
+def write_indexes(all_data: dict, per: int | None):
     """
-    all_data: {category: [dict, dict, ...]}
+    首页与各分类 README。all_data: {category: [dict, dict, ...]}
     """
     root = pathlib.Path(".")
     (root / "items").mkdir(parents=True, exist_ok=True)
+    scope = "全目录" if per is None else f"样例各 {per} 条"
 
     # 首页
     cat_links = []
-    zh_names = {
-        "weapons":"武器","armors":"防具","talismans":"护符",
-        "items":"物品","spells":"法术","ashes":"战灰",
-    }
     for cat in ["weapons","armors","talismans","items","spells","ashes"]:
         if cat in all_data:
-            cat_links.append(f"- [{zh_names[cat]}](items/{cat}/README.md)")
+            cat_links.append(f"- [{ZH_NAMES[cat]}](items/{cat}/README.md)")
     (root/"README.md").write_text(
-        "# 艾尔登法环 · 物品手册（样例各 3 条）\n\n" + "\n".join(cat_links) + "\n",
+        f"# 艾尔登法环 · 物品手册（{scope}）\n\n" + "\n".join(cat_links) + "\n",
         encoding="utf-8"
     )
 
     for cat, items in all_data.items():
         md_root = root/"items"/cat
         md_root.mkdir(parents=True, exist_ok=True)
-        # 分类 README
-        lines = [f"# {zh_names.get(cat, cat)}（样例）",""]
+        lines = [f"# {ZH_NAMES.get(cat, cat)}（{'全目录' if per is None else '样例'}）",""]
         for it in items:
             lines.append(f"- [{it['name']}](./{safe_slug(it['name'])}.md)")
         (md_root/"README.md").write_text("\n".join(lines)+"\n", encoding="utf-8")
+        SYNC.keep(md_root/"README.md")
 
-        # 条目
-        for it in items:
-            slug = safe_slug(it["name"])
-            assets_dir = root/"assets"/cat/slug
-            rel = ""
-            img_path = download_image(it.get("image",""), assets_dir)
-            if img_path:
-                rel_path = os.path.relpath(img_path, md_root)
-                rel = rel_path.replace(os.sep, "/")  # 避免 f-string 里写反斜杠
-
-            body = [f"# {it['name']}"]
-            if rel:
-                body.append(f"![icon]({rel})")
-            body.append("")
-            if it.get("header_lines"):
-                body.append(hardbreak(it["header_lines"]))
-                body.append("")
-            # 表格
-            for title, kv in it.get("kv_tables", {}).items():
-                body.append(md_table(title, kv))
-            # 段落
-            for title, txt in it.get("sections", {}).items():
-                if title in ("简介","说明"):
-                    block = "> " + "\n> ".join(txt.splitlines())
-                    body.append(block + "\n")
-                else:
-                    body.append(f"**{title}**：{txt}\n")
-
-            # 低调署名（合规必须）
-            source = it.get("source","")
-            if source:
-                body.append(f"> 来源：本文整合自公开百科页面（保留署名以符合 CC BY-NC-SA 4.0）。\n> {source}")
-
-            (md_root/f"{slug}.md").write_text("\n".join(body), encoding="utf-8")
-
-def fetch_category(cat_key: str, per: int) -> list[dict]:
-    index_url = INDEX[cat_key]
-    triples = pick_first_unique(index_url, per)
-    results = []
-    for name, url, _t in triples:
-        try:
-            html = get_html(url)
-            data = PARSERS[cat_key](html)
-            if not data.get("name"):
-                data["name"] = name
-            data["source"] = url  # 低调尾注
-            results.append(data)
-        except Exception as e:
-            sys.stderr.write(f"[warn] 解析失败：{name} -> {url} -> {e}\n")
-        time.sleep(DELAY)
-    return results
+def _parse_page(cat_key: str, html) -> tuple[dict, float, float, int, int, int, dict]:
+    """
+    解析进程里执行：只做 CPU 活，返回 (纯 dict, 开始时刻, 耗时, 进程号, 分配峰值字节, 峰值 RSS KiB,
+    快速通道计数)（解析后端等设置经环境变量继承）。耗时在这里量，主进程据此记 parse 阶段，不把排队时间算进去；
+    进程号用作时间线上的泳道；分配峰值只在 --profile-memory 开着 tracemalloc 时有值。
+    峰值 RSS 在这里量：forkserver 拉起的解析进程是孙进程，主进程的 RUSAGE_CHILDREN 看不到。
+    快速通道计数在解析进程里累加，取走带回，由主进程合并（本进程内解析时取走再合并回去）。
+    """
+    t0 = time.perf_counter()
+    data, alloc = measure_alloc(PARSERS[cat_key], html)
+    seconds = time.perf_counter() - t0
+    return data, t0, seconds, os.getpid(), alloc, peak_rss_kib(), take_fast_stats()
 
-def main():
-    # 清空仓库，仅保留工作流与脚本
-    wipe_repo_except([".github", "scripts"])
+class ParseStage:
+    """
+    解析阶段：workers=0 时在抓取线程里直接解析；>0 时交给进程池，BeautifulSoup 的 CPU 活不再占着
+    抓取线程的 GIL，也能用上多核。已抓到、还没解析完的页面最多 2×workers 份，解析跟不上时
+    抓取线程在信号量上等待，不再继续拉新页面，内存有上界。
+    memory 不为空时记录每页解析的分配峰值：子进程启动即开 tracemalloc，本进程内解析则逐页加锁量；
+    每个进程的第一页是预热，带进程号交给 memory.page() 丢掉。
+    子进程用 forkserver（没有时用 spawn）启动：池子在第一次 submit 时才建进程，那时抓取线程、
+    图标探测线程都在跑，直接 fork 可能把别的线程持有的锁一起复制过去，子进程里永远等不到释放。
+    """
+
+    def __init__(self, workers: int, memory: MemoryProfiler | None = None):
+        init = tracemalloc.start if memory is not None else None
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=init) if workers > 0 else None
+        self.slots = threading.BoundedSemaphore(2 * workers) if workers > 0 else None
+        self.memory = memory
+        if memory is not None and self.pool is not None:
+            memory.parse_in_workers = True
+        self._measure = threading.Lock()
+        self._swap = threading.Lock()
+
+    def parse(self, cat_key: str, html) -> dict:
+        out = None
+        pool = self.pool    # 别的抓取线程可能同时把池子换下，只用这份本地引用
+        if pool is not None:
+            with self.slots:
+                try:
+                    out = pool.submit(_parse_page, cat_key, html).result()
+                except BrokenExecutor as e:
+                    self._drop_pool(pool, e)
+        if out is None:
+            if self.memory is not None:
+                with self._measure:
+                    data, t0, seconds, pid, alloc, rss, fast = _parse_page(cat_key, html)
+            else:
+                data, t0, seconds, pid, alloc, rss, fast = _parse_page(cat_key, html)
+            STATS.add("parse", t0, seconds, len(html))
+        else:
+            data, t0, seconds, pid, alloc, rss, fast = out
+            STATS.add("parse", t0, seconds, len(html), tid=pid)
+        merge_fast_stats(fast)
+        if self.memory is not None:
+            self.memory.page(cat_key, STATS.current_item()[1], len(html), alloc, pid, rss)
+        return data
+
+    def _drop_pool(self, pool: ProcessPoolExecutor, err: Exception):
+        """池子坏了：只由第一个发现的线程换下并告警一次，之后所有调用都走本进程解析。"""
+        with self._swap:
+            if self.pool is not pool:
+                return
+            self.pool = None
+        sys.stderr.write(f"[warn] 解析进程池不可用，改在本进程解析：{err}\n")
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        with self._swap:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown()
+
+def process_item(cat_key: str, name: str, url: str, title: str, prev: dict | None, journal: Journal,
+                 parser: ParseStage) -> dict | None:
+    """
+    抓取 → 解析 → 写盘，每一步落一条日志。prev 是可复用的旧解析结果（revid 未变），
+    日志里已有 parsed 的条目同样跳过抓取解析，已 written 的不再重写。
+    """
+    data = journal.data.get((cat_key, title)) or prev
+    try:
+        with STATS.item(cat_key, title):
+            if data is None:
+                page = get_page(url)     # 原始字节 + 编码，解析时直接从字节建树
+                journal.log(cat_key, title, "fetched")
+                data = parser.parse(cat_key, page)
+                if not data.get("name"):
+                    data["name"] = name
+                data["source"] = url  # 低调尾注
+                journal.log(cat_key, title, "parsed", data)
+            if journal.stage(cat_key, title) != "written":
+                write_item(cat_key, data)
+                journal.log(cat_key, title, "written")
+            else:
+                keep_item(cat_key, data)
+        return data
+    except Exception as e:
+        sys.stderr.write(f"[warn] 解析失败：{name} -> {url} -> {e}\n")
+        return None
 
-    all_data = {}
-    for key in ["weapons","armors","talismans","items","spells","ashes"]:
-        try:
-            all_data[key] = fetch_category(key, PER_CAT)
-        except Exception as e:
-            sys.stderr.write(f"[warn] 抓取分类失败：{key} -> {e}\n")
+def list_category(cat_key: str, per: int | None):
+    """
+    目录页 → 条目三元组，按 MW_BATCH 条一批产出 (三元组, revid 表)：每攒够一批就用一次
+    action=query 取这些标题当前的 revid/touched 并交出，--all 时条目抓取不必等整页目录解析完。
+    """
+    batch = []
+    for triple in iter_first_unique(INDEX[cat_key], per):
+        batch.append(triple)
+        if len(batch) >= MW_BATCH:
+            yield batch, _query_revs(cat_key, batch)
+            batch = []
+    if batch:
+        yield batch, _query_revs(cat_key, batch)
+
+def _query_revs(cat_key: str, triples: list) -> dict:
+    try:
+        return mw_query_pages([t for _n, _u, t in triples])
+    except Exception as e:
+        sys.stderr.write(f"[warn] 修订号查询失败，这批条目重抓：{cat_key} -> {e}\n")
+        return {}
+
+def crawl(categories: list[str], per: int | None, concurrency: int, state: dict, journal: Journal,
+          parse_workers: int = 0, memory: MemoryProfiler | None = None) -> dict:
+    """
+    所有分类共用一个线程池：目录页并发抓取、流式解析，每解析出一批条目就投进池子。
+    限速在 lib_cn.http_get 里按 host 统一做，这里不再 sleep。
+    state 是上次运行记下的 {title: {revid, touched, category, data}}：
+    revid 与 touched 都没变的条目直接复用上次的解析结果，只有改过/新增的页面才重新抓取解析
+    （信息卡由模板渲染，改模板只会刷新 page_touched、不产生新 revid，所以两个都要比）；
+    本函数会就地更新 state；每个条目的进度写进 journal，写盘也在工作线程里逐条完成。
+    parse_workers>0 时解析交给独立的进程池（见 ParseStage），线程池只负责网络与写盘。
+    memory 给定时逐页记录解析的分配峰值（--profile-memory）。
+    返回 ({category: [dict, ...]}, 全部条目都成功的分类集合)，分类与条目顺序与串行版本一致。
+    """
+    parser = ParseStage(parse_workers, memory)
+    try:
+        return _crawl(categories, per, concurrency, state, journal, parser)
+    finally:
+        parser.close()
+
+def _crawl(categories, per, concurrency, state, journal, parser):
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="crawl") as pool:
+        item_futs = {key: [] for key in categories}
+
+        def enqueue(key):
+            # 在池里跑：目录页每产出一批就提交条目任务，不等整页处理完；只往自己分类的列表里追加
+            # 目录页抓取与修订号查询在统计里记在“*一览”名下
+            with STATS.item(key, unquote(urlparse(INDEX[key]).path.rsplit("/", 1)[-1])):
+                for triples, revs in list_category(key, per):
+                    for name, url, title in triples:
+                        rev = revs.get(title, {})
+                        prev = state.get(title) or {}
+                        unchanged = (rev.get("revid") and prev.get("revid") == rev["revid"]
+                                     and prev.get("touched") == rev.get("touched", "") and prev.get("category") == key)
+                        reuse = prev.get("data") if unchanged else None
+                        args = (key, name, url, title, reuse, journal, parser)
+                        item_futs[key].append([title, rev, args, pool.submit(process_item, *args)])
+
+        index_futs = {pool.submit(enqueue, key): key for key in categories}
+        listed = set()
+        for fut in as_completed(index_futs):
+            key = index_futs[fut]
+            try:
+                fut.result()
+                listed.add(key)
+            except Exception as e:
+                sys.stderr.write(f"[warn] 抓取分类失败：{key} -> {e}\n")
+
+        # 失败的条目排到最后再试一轮：此时限速器已按 429/5xx 自适应放慢，多数是临时性失败
+        failed = [job for key in item_futs for job in item_futs[key] if not job[3].result()]
+        if failed:
+            sys.stderr.write(f"[info] 重试 {len(failed)} 个失败条目\n")
+            for job in failed:
+                job[3] = pool.submit(process_item, *job[2])
+            for job in failed:
+                if not job[3].result():
+                    sys.stderr.write(f"[warn] 重试后仍失败：{job[0]}\n")
+
+        # 目录没列完的分类即使已提交的条目都成功，也不算完整（不做孤儿清理）
+        complete = {key for key in listed if all(job[3].result() for job in item_futs[key])}
+
+        all_data = {}
+        for key in categories:
+            if key not in listed and not item_futs[key]:
+                continue
+            all_data[key] = []
+            for title, rev, _args, f in item_futs[key]:
+                data = f.result()
+                if not data:
+                    continue
+                all_data[key].append(data)
+                if rev.get("revid"):
+                    state[title] = {"revid": rev["revid"], "touched": rev.get("touched", ""), "category": key, "data": data}
+        return all_data, complete
 
-    write_repo(all_data)
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY, help="同时在途的请求数（默认取 ER_FETCH_CONCURRENCY）")
+    ap.add_argument("--full-refresh", action="store_true", help="忽略上次的修订记录，全部重新抓取解析")
+    ap.add_argument("--all", action="store_true", help="抓取各“*一览”页上的全部条目，而不是每类 ER_FETCH_PER 条")
+    ap.add_argument("--parse-workers", type=int, default=PARSE_WORKERS, help="解析进程数，0 = 在抓取线程里解析（默认取 ER_PARSE_WORKERS）")
+    ap.add_argument("--wipe", action="store_true", help="先清空仓库（旧行为）；默认增量同步，只下新增/变化的图标")
+    ap.add_argument("--parser", choices=HTML_PARSERS, default=HTML_PARSER, help="HTML 解析后端（默认取 ER_HTML_PARSER，auto 优先 lxml）")
+    ap.add_argument("--full-parse", action="store_true", help="条目页整页建树（默认只建标题和正文区，等同 ER_PARTIAL_PARSE=0）")
+    ap.add_argument("--report", default=RUN_REPORT, metavar="PATH",
+                    help="把各阶段次数/字节/耗时分位数/最慢条目写成 JSON 运行报告（默认取 ER_RUN_REPORT）")
+    ap.add_argument("--profile-memory", nargs="?", const=MEMORY_FILE, default=os.getenv("ER_PROFILE_MEMORY", ""),
+                    metavar="PATH", help=f"tracemalloc 内存剖析：阶段边界快照、峰值 RSS、分配最多的位置、"
+                                         f"解析分配异常的页面，写到 PATH（默认 {MEMORY_FILE}）；整体会慢好几倍")
+    ap.add_argument("--trace", default=TRACE_FILE, metavar="PATH",
+                    help="把每次请求/解析/下载/写盘写成 Chrome trace 事件，用 ui.perfetto.dev 打开（默认取 ER_TRACE）")
+    args = ap.parse_args()
+    trace = None
+    if args.report or args.trace:
+        STATS.enabled = True
+        STATS.reset()
+    if args.trace:
+        trace = TraceRecorder(STATS.started)
+        STATS.listeners.append(trace)
+    memory = None
+    if args.profile_memory:
+        memory = MemoryProfiler()
+        memory.start()
+    set_html_parser(args.parser)
+    if args.full_parse:
+        set_partial_parse(False)
+    per = None if args.all else PER_CAT
+    state = {} if args.full_refresh else load_json(STATE_FILE, {})
+    journal = Journal()
+
+    if journal.resuming:
+        sys.stderr.write(f"[info] 发现未完成的进度日志，从断点续跑（已记录 {len(journal.stages)} 条）\n")
+    elif args.wipe:
+        # 清空仓库，仅保留工作流、脚本与离线样本（.cache 里的缓存与日志由 wipe_repo_except 自动保留）
+        wipe_repo_except([".github", "scripts", "fixtures"])
+
+    mark = memory.mark if memory is not None else lambda stage: None
+    mark("setup")
+    all_data, complete = crawl(list(INDEX), per, args.concurrency, state, journal, args.parse_workers, memory)
+    mark("crawl")
+    sys.stderr.write(f"[info] {fast_path_summary()}\n")
+    save_json(STATE_FILE, state)
+    mark("save_state")
+    write_indexes(all_data, per)
+    mark("write_indexes")
+    # 只清理整类都成功的分类：抓取失败的条目保留上次的文件，不当孤儿删掉
+    removed = SYNC.prune([pathlib.Path(d)/cat for cat in sorted(complete) for d in ("items", "assets")])
+    if removed:
+        sys.stderr.write(f"[info] 删除孤儿文件 {len(removed)} 个\n")
+    mark("prune")
+    journal.finish()
+    if memory is not None:
+        write_memory_profile(pathlib.Path(args.profile_memory), memory)
+    if args.report:
+        write_report(pathlib.Path(args.report), args, per, all_data, complete)
+    if trace is not None:
+        trace.save(pathlib.Path(args.trace))
+        sys.stderr.write(f"[info] 时间线 → {args.trace}（{len(trace.events)} 个事件）\n")
+
+def write_report(path: pathlib.Path, args, per: int | None, all_data: dict, complete: set):
+    """运行报告：本次参数、各分类条数，加上 lib_cn.STATS 的分阶段统计。"""
+    report = {
+        "settings": {
+            "per": per,
+            "concurrency": args.concurrency,
+            "parse_workers": args.parse_workers,
+            "parser": html_parser_name(),
+            "full_parse": args.full_parse,
+        },
+        "fast_path": fast_path_stats(),
+        "items": {cat: len(items) for cat, items in all_data.items()},
+        "complete": sorted(complete),
+        **STATS.report(),
+    }
+    save_json(path, report)
+    stages = report["stages"]
+    summary = "，".join(f"{k} {v['count']} 次 p50 {v['p50_ms']:.0f}ms" for k, v in stages.items()
+                       if k in ("fetch", "parse", "icon", "write"))
+    sys.stderr.write(f"[info] 运行报告 → {path}（{summary}）\n")
+
+def write_memory_profile(path: pathlib.Path, memory: MemoryProfiler):
+    report = memory.report()
+    memory.stop()
+    save_json(path, report)
+    peak = max((s["peak_kib"] for s in report["stages"]), default=0)
+    rss = report["peak_rss_kib"]
+    workers = f" / 解析进程 {rss['parse_workers'] / 1024:.1f} MiB" if rss["parse_workers"] else ""
+    sys.stderr.write(f"[info] 内存剖析 → {path}（tracemalloc 峰值 {peak / 1024:.1f} MiB，"
+                     f"峰值 RSS 本进程 {rss['self'] / 1024:.1f} MiB{workers}）\n")
+    if "note" in report:
+        sys.stderr.write(f"[info] {report['note']}\n")
+    too_few = report["outlier_check"]["too_few"]
+    if too_few:
+        sys.stderr.write(f"[info] 以下分类解析样本不到 {report['outlier_check']['min_pages']} 页，不判分配异常："
+                         + "，".join(f"{cat} {n} 页" for cat, n in too_few.items()) + "\n")
+    for o in report["outliers"]:
+        sys.stderr.write(f"[warn] 解析分配异常：{o['category']}/{o['title']} {o['alloc_kib']} KiB，"
+                         f"同类中位数的 {o['x_median']} 倍\n")
 
 if __name__ == "__main__":
     main()
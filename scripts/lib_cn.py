@@ -8,12 +8,34 @@ lib_cn.py
 
 import os
 import re
+import sys
+import json
+import math
+import codecs
 import time
+import atexit
+import random
+import shutil
+import hashlib
 import pathlib
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from itertools import islice
+from email.utils import parsedate_to_datetime
+from html.parser import HTMLParser
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse, parse_qs, unquote
 
+try:
+    import resource     # 峰值 RSS；Windows 没有
+except ImportError:
+    resource = None
+
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, NavigableString, SoupStrainer, Tag
 
 HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) ER-Items-Fetch/2.0"}
 BAD_PREFIXES = (
@@ -22,28 +44,827 @@ BAD_PREFIXES = (
 )
 
 
+# -------------------- 共享连接池 --------------------
+
+POOL_SIZE = int(os.getenv("ER_POOL_SIZE", "8"))     # 每个 host 保持的 keep-alive 连接数
+
+def make_session(pool_size: int = POOL_SIZE) -> requests.Session:
+    """带默认请求头与连接池的 Session；wiki 页面与图片 CDN 各占一个 host 池，握手只做一次。"""
+    s = requests.Session()
+    s.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+# 所有脚本共用的抓取客户端
+SESSION = make_session()
+
+
+# -------------------- 运行统计 --------------------
+
+class _Span:
+    __slots__ = ("bytes",)
+
+    def __init__(self, nbytes: int = 0):
+        self.bytes = nbytes
+
+def _percentile(sorted_vals: list[float], q: float) -> float:
+    """最近秩百分位（第 ceil(q/100·n) 个）；sorted_vals 已升序且非空。"""
+    k = max(0, min(len(sorted_vals) - 1, math.ceil(q / 100 * len(sorted_vals)) - 1))
+    return sorted_vals[k]
+
+class RunStats:
+    """
+    按阶段（wait/http/fetch/parse/icon/download/write…）记录每次调用的耗时与字节数，
+    结束时汇总成运行报告（次数、字节、p50/p95/p99、最慢的几个标题）。默认关闭，
+    关闭时 stage()/staged 只多一次属性判断。分类/标题由 item() 按线程设置，
+    里面嵌套的 HTTP、下载等记录自动带上；listeners 收到每条原始记录
+    (阶段, 开始 perf_counter, 耗时, 字节数, 分类, 标题, 线程号)，时间线导出之类挂在这上面。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self._records: dict[str, list[tuple[float, int, str, str]]] = {}
+            self.counters: dict[str, int] = {}
+
+    @contextmanager
+    def item(self, category: str, title: str):
+        """当前线程接下来的记录都算在这个条目名下。"""
+        prev = getattr(self._local, "item", ("", ""))
+        self._local.item = (category, title)
+        try:
+            yield
+        finally:
+            self._local.item = prev
+
+    @contextmanager
+    def stage(self, name: str, nbytes: int = 0):
+        """计时一段代码；with 里可以设置 span.bytes。"""
+        span = _Span(nbytes)
+        if not self.enabled:
+            yield span
+            return
+        t0 = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.add(name, t0, time.perf_counter() - t0, span.bytes)
+
+    def add(self, name: str, start: float, seconds: float, nbytes: int = 0, tid: int | None = None):
+        """记一条已经量好的记录（例如解析进程里量的耗时）。"""
+        if not self.enabled:
+            return
+        cat, title = self.current_item()
+        with self._lock:
+            self._records.setdefault(name, []).append((seconds, nbytes, cat, title))
+        tid = threading.get_ident() if tid is None else tid
+        for fn in self.listeners:
+            fn(name, start, seconds, nbytes, cat, title, tid)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def current_item(self) -> tuple[str, str]:
+        return getattr(self._local, "item", ("", ""))
+
+    def report(self, slowest: int = 5) -> dict:
+        with self._lock:
+            records = {k: list(v) for k, v in self._records.items()}
+            counters = dict(sorted(self.counters.items()))
+        stages = {}
+        for name, recs in sorted(records.items()):
+            secs = sorted(r[0] for r in recs)
+            worst = sorted(recs, key=lambda r: r[0], reverse=True)[:slowest]
+            stages[name] = {
+                "count": len(recs),
+                "bytes": sum(r[1] for r in recs),
+                "total_s": round(sum(secs), 3),
+                "p50_ms": round(_percentile(secs, 50) * 1e3, 2),
+                "p95_ms": round(_percentile(secs, 95) * 1e3, 2),
+                "p99_ms": round(_percentile(secs, 99) * 1e3, 2),
+                "max_ms": round(secs[-1] * 1e3, 2),
+                "slowest": [{"category": c, "title": t, "ms": round(sec * 1e3, 2)}
+                            for sec, _b, c, t in worst if c or t],
+            }
+        return {
+            "wall_s": round(time.perf_counter() - self.started, 3),
+            "stages": stages,
+            "counters": counters,
+        }
+
+STATS = RunStats()
+
+class TraceRecorder:
+    """
+    STATS 的监听器：每条记录转成一个 Chrome trace event（ph=X，完整区间），
+    save() 写成 chrome://tracing / ui.perfetto.dev 能直接打开的 JSON。
+    每个线程一条泳道（解析子进程按进程号单独成道），args 里带分类、标题、字节数；
+    限速等待记为 wait，能直接看到哪条请求被限速器卡住、哪个工作线程在空等。
+    """
+
+    def __init__(self, origin: float | None = None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.pid = os.getpid()
+        self.events = []
+        self._lanes: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, name, start, seconds, nbytes, category, title, tid):
+        ev = {
+            "name": name, "cat": category or "-", "ph": "X", "pid": self.pid, "tid": tid,
+            "ts": round((start - self.origin) * 1e6, 1), "dur": round(seconds * 1e6, 1),
+            "args": {"title": title, "bytes": nbytes},
+        }
+        with self._lock:
+            if tid not in self._lanes:
+                cur = threading.current_thread()
+                self._lanes[tid] = cur.name if tid == cur.ident else f"parse-{tid}"
+            self.events.append(ev)
+
+    def save(self, path: pathlib.Path):
+        with self._lock:
+            meta = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": lane}}
+                    for tid, lane in self._lanes.items()]
+            events = sorted(self.events, key=lambda e: e["ts"])
+        _write_atomic(path, json.dumps({"traceEvents": meta + events, "displayTimeUnit": "ms"},
+                                       ensure_ascii=False).encode("utf-8"))
+
+def peak_rss_kib() -> int:
+    """
+    调用进程自己的峰值 RSS，单位 KiB；没有 resource 模块时为 0。
+    解析进程由 forkserver 拉起，是本进程的孙进程，RUSAGE_CHILDREN 数不到它们，
+    所以由解析进程各自量了随结果带回来（见 MemoryProfiler.page）。
+    """
+    if resource is None:
+        return 0
+    scale = 1024 if sys.platform == "darwin" else 1     # macOS 的 ru_maxrss 是字节
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale
+
+class MemoryProfiler:
+    """
+    tracemalloc 内存剖析：mark(阶段) 在阶段边界拍快照，记下当前/阶段内峰值/峰值 RSS，
+    以及与上个边界相比净增最多的分配位置；page() 收集每页解析时的分配峰值和解析进程的峰值 RSS，
+    report() 里把超过同分类中位数 outlier 倍的页面单独列出，用来估 CI 机器内存、提前发现泄漏；
+    同类页数不到 min_pages 时中位数不可靠，不判异常，在 outlier_check.too_few 里列出页数。
+    每个进程解析的第一页带着惰性导入、解析后端初始化这些一次性分配，page() 传了进程号时
+    丢掉这一条，不让新起的解析进程把第一页误报成异常。
+    快照只看得到本进程：解析交给子进程（parse_in_workers）时，stages 里的分配位置不含解析代码，
+    解析的分配只体现在 parse/outliers 里，report() 会注明。
+    开着 tracemalloc 整体会慢好几倍，只在剖析时用。
+    """
+
+    # 快照里不算 tracemalloc 自己和导入机制的分配
+    _FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self, top: int = 10, outlier: float = 3.0, min_pages: int = 3):
+        self.top = top
+        self.outlier = outlier
+        self.min_pages = min_pages
+        self.stages = []
+        self.pages: list[tuple[str, str, int, int]] = []   # (分类, 标题, 页面字节, 解析分配峰值)
+        self.parse_in_workers = False
+        self._warm: set[int] = set()                # 已丢过预热页的进程号
+        self._worker_rss: dict[int, int] = {}       # 解析进程号 → 峰值 RSS（KiB）
+        self._lock = threading.Lock()
+        self._prev = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._prev = tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+
+    def mark(self, stage: str):
+        snap = tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, _take_alloc_peak())
+        tracemalloc.reset_peak()
+        diff = snap.compare_to(self._prev, "lineno")[:self.top] if self._prev else []
+        self._prev = snap
+        self.stages.append({
+            "stage": stage,
+            "current_kib": current // 1024,
+            "peak_kib": peak // 1024,
+            "rss_kib": peak_rss_kib(),
+            "top": [{"site": f"{st.traceback[0].filename}:{st.traceback[0].lineno}",
+                     "size_diff_kib": round(st.size_diff / 1024, 1), "count_diff": st.count_diff}
+                    for st in diff if st.size_diff > 0],
+        })
+
+    def page(self, category: str, title: str, nbytes: int, alloc: int, pid: int | None = None, rss_kib: int = 0):
+        with self._lock:
+            if pid is not None and pid != os.getpid():
+                self._worker_rss[pid] = max(self._worker_rss.get(pid, 0), rss_kib)
+            if pid is not None and pid not in self._warm:
+                self._warm.add(pid)     # 预热页，不计
+                return
+            self.pages.append((category, title, nbytes, alloc))
+
+    def _by_category(self) -> dict[str, list[int]]:
+        by_cat: dict[str, list[int]] = {}
+        for cat, _t, _n, alloc in self.pages:
+            by_cat.setdefault(cat, []).append(alloc)
+        return by_cat
+
+    def outliers(self) -> list[dict]:
+        """分配峰值超过同类中位数 outlier 倍的页面；页数不到 min_pages 的分类不判。"""
+        median = {cat: sorted(v)[len(v) // 2] for cat, v in self._by_category().items() if len(v) >= self.min_pages}
+        out = [{"category": cat, "title": title, "page_kib": nbytes // 1024, "alloc_kib": alloc // 1024,
+                "x_median": round(alloc / median[cat], 1)}
+               for cat, title, nbytes, alloc in self.pages
+               if median.get(cat) and alloc > self.outlier * median[cat]]
+        return sorted(out, key=lambda o: o["x_median"], reverse=True)
+
+    def report(self) -> dict:
+        per_cat = {}
+        for cat, _t, nbytes, alloc in self.pages:
+            c = per_cat.setdefault(cat, {"pages": 0, "page_bytes": 0, "alloc_bytes": 0, "alloc_max_kib": 0})
+            c["pages"] += 1
+            c["page_bytes"] += nbytes
+            c["alloc_bytes"] += alloc
+            c["alloc_max_kib"] = max(c["alloc_max_kib"], alloc // 1024)
+        for c in per_cat.values():
+            c["alloc_mean_kib"] = c.pop("alloc_bytes") // 1024 // c["pages"]
+            c["page_mean_kib"] = c.pop("page_bytes") // 1024 // c["pages"]
+        report = {
+            "stages": self.stages,
+            "peak_rss_kib": {"self": peak_rss_kib(), "parse_workers": max(self._worker_rss.values(), default=0)},
+            "parse": per_cat,
+            "parse_warmup_skipped": len(self._warm),
+            "outlier_check": {
+                "min_pages": self.min_pages,
+                "too_few": {cat: len(v) for cat, v in self._by_category().items() if len(v) < self.min_pages},
+            },
+            "outliers": self.outliers(),
+        }
+        if self.parse_in_workers:
+            report["note"] = "解析在子进程里，stages[].top 只含本进程的分配位置（抓取、写盘等），不含解析代码"
+        return report
+
+    def stop(self):
+        self._prev = None
+        tracemalloc.stop()
+
+_alloc_peak = 0     # measure_alloc 重置峰值前看到的最大值，mark() 合进阶段峰值
+
+def _take_alloc_peak() -> int:
+    global _alloc_peak
+    peak, _alloc_peak = _alloc_peak, 0
+    return peak
+
+def measure_alloc(fn, *args):
+    """
+    在 tracemalloc 开着时返回 (结果, 这次调用比调用前多占的峰值字节)；没开时记 0。
+    要重置全局峰值，调用方需保证同一时刻只有一处在量（解析子进程天然如此，本进程内解析时加锁）。
+    """
+    global _alloc_peak
+    if not tracemalloc.is_tracing():
+        return fn(*args), 0
+    base, peak = tracemalloc.get_traced_memory()
+    _alloc_peak = max(_alloc_peak, peak)
+    tracemalloc.reset_peak()
+    out = fn(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    _alloc_peak = max(_alloc_peak, peak)
+    return out, max(0, peak - base)
+
+def staged(name: str, size=None):
+    """装饰器：整个函数算一个阶段；size(返回值, *参数) 给出字节数。"""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not STATS.enabled:
+                return fn(*args, **kwargs)
+            with STATS.stage(name) as span:
+                out = fn(*args, **kwargs)
+                if size is not None:
+                    span.bytes = size(out, *args)
+                return out
+        return wrapper
+    return deco
+
+def file_size(path) -> int:
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+# -------------------- 按 host 限速 & 重试 --------------------
+
+FETCH_DELAY = float(os.getenv("ER_FETCH_DELAY", "0.7"))   # 平均请求间隔（秒），可被 Actions 传参覆盖
+FETCH_BURST = int(os.getenv("ER_FETCH_BURST", "2"))       # 令牌桶容量：空闲后允许的突发请求数
+FETCH_RETRIES = int(os.getenv("ER_FETCH_RETRIES", "4"))   # 连接错误 / 429 / 5xx 的最大重试次数
+MAX_DELAY = 30.0                                          # 被限流时请求间隔的上限（秒）
+MIN_DELAY = 0.05                                          # 算加性提速步长时的间隔下限（ER_FETCH_DELAY=0 时用）
+RECOVER_STEP = 0.1                                        # 每次成功，速率回升基准速率的这个比例
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class HostRateLimiter:
+    """
+    每个 host 一个令牌桶：令牌按 1/delay 每秒补充，最多攒 burst 个。
+    多线程并发时请求“发起”被均匀摊开，但允许多个请求同时在途，
+    整体平均速率仍然是 ER_FETCH_DELAY 那个礼貌值。
+
+    速率按 AIMD 自适应：遇到 429/5xx/连接错误时该 host 的速率减半（间隔翻倍），
+    之后每次成功速率加回基准速率的 RECOVER_STEP，十来次成功就回到 ER_FETCH_DELAY；
+    带 Retry-After 时整个 host 暂停到期为止。
+    同一批在途请求只减半一次：acquire 返回该 host 当前的“代”，每次减速进入下一代，
+    减速之前发出的请求再失败不会接着翻倍（几个线程同时撞上一波 429 只算一次）。
+    """
+
+    def __init__(self, delay: float = FETCH_DELAY, burst: int = FETCH_BURST):
+        self.delay = delay
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        self._buckets: dict[str, tuple[float, float]] = {}   # host -> (令牌数, 上次结算时刻)
+        self._delays: dict[str, float] = {}                  # host -> 当前自适应间隔
+        self._paused: dict[str, float] = {}                  # host -> 暂停到的 monotonic 时刻
+        self._gens: dict[str, int] = {}                      # host -> 减速次数（代）
+
+    def current_delay(self, url: str) -> float:
+        return self._delays.get(urlparse(url).netloc, self.delay)
+
+    def acquire(self, url: str) -> int:
+        """等到有令牌；返回当前的代，失败时交给 penalize。"""
+        host = urlparse(url).netloc
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._delays.get(host, self.delay)
+                tokens, last = self._buckets.get(host, (float(self.burst), now))
+                if delay > 0:
+                    tokens = min(float(self.burst), tokens + (now - last) / delay)
+                else:
+                    tokens = float(self.burst)
+                pause = self._paused.get(host, 0.0) - now
+                if pause <= 0 and tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return self._gens.get(host, 0)
+                self._buckets[host] = (tokens, now)
+                wait = max(pause, (1 - tokens) * delay)
+            time.sleep(wait)
+
+    def penalize(self, url: str, pause: float = 0.0, gen: int | None = None):
+        """
+        乘性降速；gen 是该请求 acquire 时拿到的代，早于上次减速的请求不再减速。
+        pause>0（来自 Retry-After）时该 host 所有线程都先停下。
+        """
+        host = urlparse(url).netloc
+        with self._lock:
+            if gen is None or gen >= self._gens.get(host, 0):
+                delay = self._delays.get(host, self.delay)
+                self._delays[host] = min(MAX_DELAY, max(delay * 2, 0.5))
+                self._gens[host] = self._gens.get(host, 0) + 1
+            if pause > 0:
+                self._paused[host] = max(self._paused.get(host, 0.0), time.monotonic() + pause)
+
+    def reward(self, url: str):
+        """加性提速：按速率（1/间隔）加，不按间隔减，间隔被翻到很大时也能很快回来。"""
+        host = urlparse(url).netloc
+        with self._lock:
+            delay = self._delays.get(host)
+            if delay is None:
+                return
+            base_rate = 1.0 / max(self.delay, MIN_DELAY)
+            rate = 1.0 / delay + base_rate * RECOVER_STEP
+            if rate >= base_rate or 1.0 / rate <= self.delay:
+                del self._delays[host]
+            else:
+                self._delays[host] = 1.0 / rate
+
+RATE_LIMITER = HostRateLimiter()
+
+def retry_after_seconds(value: str | None) -> float:
+    """Retry-After 可能是秒数，也可能是 HTTP 日期；解析不了就当没给。"""
+    if not value:
+        return 0.0
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return max(0.0, when.timestamp() - time.time())
+
+def backoff_seconds(attempt: int) -> float:
+    """指数退避 + full jitter：第 n 次重试在 [0, min(MAX_DELAY, 2^n)) 之间随机等待。"""
+    return random.uniform(0, min(MAX_DELAY, 2.0 ** attempt))
+
+def http_request(method: str, url: str, retries: int = FETCH_RETRIES, **kwargs) -> requests.Response:
+    """
+    所有出站请求的统一入口：先过限速，再走共享 Session。
+    连接错误 / 超时 / 429 / 5xx 会退避重试（优先遵守 Retry-After）；
+    重试用尽后连接错误照常抛出，错误状态码原样返回给调用方 raise_for_status。
+    """
+    for attempt in range(retries + 1):
+        with STATS.stage("wait"):
+            gen = RATE_LIMITER.acquire(url)
+        try:
+            t0 = time.perf_counter()
+            with STATS.stage("http") as span:
+                r = SESSION.request(method, url, **kwargs)
+                # 流式下载的正文在调用方读（记在 download 阶段），这里只算非流式的
+                span.bytes = 0 if kwargs.get("stream") else len(r.content)
+            # ttfb：发出请求到响应头到齐，含新建连接时的 DNS/TCP/TLS；与 http 之差是正文传输
+            if STATS.enabled and getattr(r, "elapsed", None) is not None:
+                STATS.add("ttfb", t0, r.elapsed.total_seconds())
+        except (requests.ConnectionError, requests.Timeout):
+            STATS.count("http.error")
+            RATE_LIMITER.penalize(url, gen=gen)
+            if attempt >= retries:
+                raise
+            with STATS.stage("backoff"):
+                time.sleep(backoff_seconds(attempt))
+            continue
+        STATS.count(f"http.{r.status_code}")
+        if r.status_code in RETRY_STATUSES and attempt < retries:
+            pause = min(MAX_DELAY, retry_after_seconds(r.headers.get("Retry-After")))
+            RATE_LIMITER.penalize(url, pause, gen)
+            r.close()
+            with STATS.stage("backoff"):
+                time.sleep(max(pause, backoff_seconds(attempt)))
+            continue
+        if r.status_code not in RETRY_STATUSES:
+            RATE_LIMITER.reward(url)
+        return r
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    return http_request("GET", url, **kwargs)
+
+
+# -------------------- HTTP 缓存 --------------------
+
+# 本地缓存根目录（相对仓库根）；wipe_repo_except 不会删它
+CACHE_DIR = pathlib.Path(os.getenv("ER_CACHE_DIR", ".cache"))
+HTTP_CACHE = os.getenv("ER_HTTP_CACHE", "1") != "0"   # 设为 0 可关闭磁盘缓存
+
+def _cache_paths(url: str) -> tuple[pathlib.Path, pathlib.Path]:
+    """按 URL 的 sha256 分桶：<key>.json 存 ETag/Last-Modified/编码，<key>.body 存原始字节。"""
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    d = CACHE_DIR / "http" / key[:2]
+    return d / f"{key}.json", d / f"{key}.body"
+
+def _tmp_path(path: pathlib.Path) -> pathlib.Path:
+    """同目录下的临时文件名（带进程/线程号，并发写同一目标也不会互相踩）。"""
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+def _write_atomic(path: pathlib.Path, content: bytes):
+    ensure_dir(path.parent)
+    tmp = _tmp_path(path)
+    tmp.write_bytes(content)
+    os.replace(tmp, path)
+
+def cache_load(url: str) -> dict | None:
+    """读缓存元信息；正文文件缺失视为未命中。"""
+    if not HTTP_CACHE:
+        return None
+    meta_p, body_p = _cache_paths(url)
+    try:
+        meta = json.loads(meta_p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if meta.get("url") != url or not body_p.exists():
+        return None
+    return meta
+
+def cache_body(url: str) -> bytes:
+    return _cache_paths(url)[1].read_bytes()
+
+def cache_store(url: str, body: bytes, etag: str, last_modified: str, encoding: str):
+    """只有带校验器（ETag / Last-Modified）的响应才值得缓存，否则下次无法条件请求。"""
+    if not HTTP_CACHE or not (etag or last_modified):
+        return
+    meta_p, body_p = _cache_paths(url)
+    meta = {"url": url, "etag": etag or "", "last_modified": last_modified or "", "encoding": encoding}
+    try:
+        _write_atomic(body_p, body)
+        _write_atomic(meta_p, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+    except OSError:
+        pass
+
+
+# -------------------- 增量状态 --------------------
+
+# 每个已抓标题上次的 revid / touched（以及解析结果），用于判断页面是否改过
+STATE_FILE = CACHE_DIR / "revisions.json"
+
+def load_json(path: pathlib.Path, default):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return default
+
+def save_json(path: pathlib.Path, obj):
+    _write_atomic(path, json.dumps(obj, ensure_ascii=False, indent=1).encode("utf-8"))
+
+JOURNAL_FILE = CACHE_DIR / "journal.jsonl"
+
+class Journal:
+    """
+    追加写的进度日志：每行一条 {"cat","title","stage"[,"data"]}，stage 依次为
+    fetched → parsed → written。进程中途被杀/CI 超时后，下次启动读回来即可从断点续跑；
+    整轮跑完调用 finish() 删除。parsed 记录里带解析结果，续跑时不必重新抓取解析。
+    """
+
+    def __init__(self, path: pathlib.Path = JOURNAL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fh = None
+        self.stages: dict[tuple[str, str], str] = {}
+        self.data: dict[tuple[str, str], dict] = {}
+        try:
+            lines = path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            lines = []
+        for ln in lines:
+            try:
+                rec = json.loads(ln)
+            except ValueError:
+                continue   # 崩溃时写了一半的最后一行
+            key = (rec["cat"], rec["title"])
+            self.stages[key] = rec["stage"]
+            if "data" in rec:
+                self.data[key] = rec["data"]
+
+    @property
+    def resuming(self) -> bool:
+        return bool(self.stages)
+
+    def stage(self, cat: str, title: str) -> str:
+        return self.stages.get((cat, title), "")
+
+    def log(self, cat: str, title: str, stage: str, data: dict | None = None):
+        rec = {"cat": cat, "title": title, "stage": stage}
+        if data is not None:
+            rec["data"] = data
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._fh is None:
+                ensure_dir(self.path.parent)
+                self._fh = open(self.path, "a", encoding="utf-8")
+            self._fh.write(line)
+            self._fh.flush()
+            self.stages[(cat, title)] = stage
+            if data is not None:
+                self.data[(cat, title)] = data
+
+    def finish(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+
 # -------------------- HTTP & HTML --------------------
 
-def get_html(url: str, timeout: float = 25.0) -> str:
-    r = requests.get(url, headers=HEADERS, timeout=timeout)
+_CT_CHARSET = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.I)
+_META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?([\w.:-]+)", re.I)
+META_SNIFF_BYTES = 4096
+_host_charsets: dict[str, str] = {}     # host -> 该站点声明过的编码
+
+def _codec(name: str) -> str | None:
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+def resolve_charset(url: str, content_type: str, body: bytes, detect=None) -> str:
+    """
+    定正文编码，便宜的先来：Content-Type 里的 charset → 正文前 4KB 的 <meta charset> →
+    同 host 上次声明过的编码 → detect()（统计检测，要扫全文，最后才用）→ utf-8。
+    ISO-8859-1 多是服务器缺省值而非真实编码（requests 对 text/* 也这样兜底），当作没声明。
+    url 为空（html_text 解本地字节）时没有 host，不读也不写 host 编码表。
+    """
+    m = _CT_CHARSET.search(content_type or "")
+    enc = _codec(m.group(1)) if m else None
+    if enc == "iso8859-1":
+        enc = None
+    if not enc:
+        m = _META_CHARSET.search(body[:META_SNIFF_BYTES])
+        enc = _codec(m.group(1).decode("ascii")) if m else None
+    host = urlparse(url).netloc if url else ""
+    if enc:
+        if host:
+            _host_charsets[host] = enc
+        return enc
+    return (_host_charsets.get(host) if host else None) or (detect() if detect else None) or "utf-8"
+
+class Page(bytes):
+    """
+    原始正文字节 + 已确定的编码。解析器可以直接拿它建树（bs4/lxml 按 encoding 解一次码），
+    需要 str 时用 .text；get_html 就是 get_page(...).text。
+    """
+    encoding = "utf-8"
+
+    @property
+    def text(self) -> str:
+        return self.decode(self.encoding, errors="replace")
+
+def _page(body: bytes, encoding: str) -> Page:
+    page = Page(body)
+    page.encoding = encoding
+    return page
+
+def html_text(markup) -> str:
+    """解析器入口统一：str 原样返回，Page 按它的编码解码，其余 bytes 按 <meta charset> 或 utf-8。"""
+    if isinstance(markup, Page):
+        return markup.text
+    if isinstance(markup, (bytes, bytearray)):
+        return bytes(markup).decode(resolve_charset("", "", markup), errors="replace")
+    return markup
+
+@staged("fetch", lambda page, *_: len(page))
+def get_page(url: str, timeout: float = 25.0) -> Page:
+    """
+    GET 页面原始字节（附编码）；命中磁盘缓存时带 If-None-Match / If-Modified-Since，
+    服务器回 304 就直接用本地正文。
+    """
+    headers = {}
+    meta = cache_load(url)
+    if meta:
+        if meta["etag"]:
+            headers["If-None-Match"] = meta["etag"]
+        if meta["last_modified"]:
+            headers["If-Modified-Since"] = meta["last_modified"]
+    r = http_get(url, headers=headers, timeout=timeout)
+    if r.status_code == 304 and meta:
+        return _page(cache_body(url), meta["encoding"] or "utf-8")
     r.raise_for_status()
-    if not r.encoding or r.encoding.lower() == "iso-8859-1":
-        r.encoding = r.apparent_encoding or "utf-8"
-    return r.text
+    enc = resolve_charset(url, r.headers.get("Content-Type", ""), r.content, lambda: r.apparent_encoding)
+    cache_store(url, r.content, r.headers.get("ETag", ""), r.headers.get("Last-Modified", ""), enc)
+    return _page(r.content, enc)
+
+def get_html(url: str, timeout: float = 25.0) -> str:
+    """GET 页面文本（见 get_page）。"""
+    return get_page(url, timeout).text
+
+# -------------------- MediaWiki API --------------------
+
+API = "https://wiki.biligame.com/eldenring/api.php"
+MW_BATCH = 50   # 匿名用户 titles= 一次最多 50 个
+
+def mw_query_pages(titles, timeout: float = 20.0) -> dict[str, dict]:
+    """
+    用 action=query 批量解析标题（跟随重定向），每 50 个标题一次往返。
+    返回 {原标题: {"title": 规范标题, "pageid", "revid", "touched", "missing"}}。
+    """
+    titles = list(dict.fromkeys(t for t in titles if t))
+    out = {}
+    for i in range(0, len(titles), MW_BATCH):
+        chunk = titles[i:i + MW_BATCH]
+        r = http_get(API, params={
+            "action": "query",
+            "titles": "|".join(chunk),
+            "redirects": 1,
+            "prop": "info|revisions",
+            "rvprop": "ids",
+            "format": "json",
+            "formatversion": 2,
+        }, timeout=timeout)
+        r.raise_for_status()
+        q = r.json().get("query", {})
+        # normalized / redirects 都是 from -> to，可能串联（先规范化再重定向）
+        alias = {n["from"]: n["to"] for n in q.get("normalized", [])}
+        alias.update({n["from"]: n["to"] for n in q.get("redirects", [])})
+        pages = {p["title"]: p for p in q.get("pages", [])}
+        for t in chunk:
+            cur, hops = t, 0
+            while cur in alias and hops < 5:
+                cur, hops = alias[cur], hops + 1
+            p = pages.get(cur, {})
+            rev = (p.get("revisions") or [{}])[0]
+            out[t] = {
+                "title": p.get("title", cur),
+                "pageid": p.get("pageid", 0),
+                "revid": rev.get("revid") or p.get("lastrevid", 0),
+                "touched": p.get("touched", ""),
+                "missing": not p or p.get("missing", False) or p.get("invalid", False),
+            }
+    return out
+
+
+# -------------------- HTML 解析 --------------------
+
+# 解析后端：auto 有 lxml 就用 lxml（快数倍），否则用标准库 html.parser；也可显式指定
+HTML_PARSER = os.getenv("ER_HTML_PARSER", "auto")
+HTML_PARSERS = ("auto", "lxml", "html.parser")
+
+def _resolve_parser(name: str) -> str:
+    if name not in HTML_PARSERS:
+        raise ValueError(f"未知的 HTML 解析后端：{name}（可选 {', '.join(HTML_PARSERS)}）")
+    if name == "html.parser":
+        return name
+    try:
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        if name == "lxml":
+            sys.stderr.write("[warn] 未安装 lxml，回退到 html.parser\n")
+        return "html.parser"
+
+_parser = _resolve_parser(HTML_PARSER)
+
+def set_html_parser(name: str):
+    """切换全局解析后端（命令行 --parser 用）；子进程通过环境变量继承。"""
+    global _parser
+    _parser = _resolve_parser(name)
+    os.environ["ER_HTML_PARSER"] = _parser
+
+def html_parser_name() -> str:
+    return _parser
+
+def make_soup(markup) -> BeautifulSoup:
+    """
+    所有解析器统一从这里建树；两种后端抽出来的字典必须一致（见 scripts/check_parsers.py）。
+    markup 可以是 str，也可以是 get_page 返回的 Page（按其编码直接从字节建树，不先解码成 str）。
+    """
+    return BeautifulSoup(markup, _parser, from_encoding=getattr(markup, "encoding", None))
+
+# 局部建树：条目页解析器只用标题 h1.firstHeading 和正文 .mw-parser-output（表格/段落/h2），
+# 皮肤的导航、侧栏、脚本一律不建节点；ER_PARTIAL_PARSE=0 关掉，回到整页建树
+PARTIAL_PARSE = os.getenv("ER_PARTIAL_PARSE", "1") != "0"
+_partial = PARTIAL_PARSE
+# 建树时 class 还是原始字符串（多个类名以空格分隔），所以按单词匹配
+_CONTENT_ONLY = SoupStrainer(["h1", "div"], class_=re.compile(r"(?:^|\s)(?:firstHeading|mw-parser-output)(?:\s|$)"))
+
+def set_partial_parse(flag: bool):
+    """切换条目页局部建树；子进程通过环境变量继承。"""
+    global _partial
+    _partial = bool(flag)
+    os.environ["ER_PARTIAL_PARSE"] = "1" if _partial else "0"
+
+def make_page_soup(html) -> BeautifulSoup:
+    """
+    条目页建树：默认只保留标题与正文两块子树。
+    任一块缺失（改版/非常规页面）就回退整页建树，保证解析结果与整页一致（见 scripts/check_parsers.py）。
+    """
+    if _partial:
+        soup = BeautifulSoup(html, _parser, parse_only=_CONTENT_ONLY, from_encoding=getattr(html, "encoding", None))
+        if soup.select_one("h1.firstHeading") and soup.select_one(".mw-parser-output"):
+            return soup
+    return make_soup(html)
 
 def soup_of(url: str) -> BeautifulSoup:
-    return BeautifulSoup(get_html(url), "html.parser")
+    return make_soup(get_html(url))
+
+_TEXT_TYPES = Tag.MAIN_CONTENT_STRING_TYPES   # 与 get_text 默认一致：不含注释、<script>/<style> 内容
+
+def _text_pieces(tag) -> tuple[str, ...]:
+    """节点下全部非空文字段（已 strip，文档顺序）；结果挂在节点上，同一棵树里父节点直接拼子节点的结果。"""
+    memo = tag.__dict__.get("_er_pieces")
+    if memo is not None:
+        return memo
+    out = []
+    for child in tag.children:
+        if isinstance(child, Tag):
+            out += _text_pieces(child)      # <br> 没有文字，段与段之间本就以换行相接
+        elif type(child) in _TEXT_TYPES:
+            s = child.strip()
+            if s:
+                out.append(s)
+    memo = tag.__dict__["_er_pieces"] = tuple(out)
+    return memo
 
 def text_with_newlines(tag) -> str:
-    """把 <br> 换成换行，避免挤成一行。"""
+    """
+    取节点文本，<br> 与各文字段之间都按换行分隔，避免挤成一行。
+    只读遍历、不改动原树；结果按节点缓存，同一次建树内重复调用（行/整表/标题行）不再重算。
+    """
     if tag is None:
         return ""
-    for br in tag.find_all("br"):
-        br.replace_with("\n")
-    txt = tag.get_text("\n", strip=True)
+    memo = tag.__dict__.get("_er_text")
+    if memo is None:
+        if tag.interesting_string_types not in (None, _TEXT_TYPES):
+            raw = tag.get_text("\n", strip=True)    # <script>/<style> 本身：按它自己的文字类型取
+        else:
+            raw = "\n".join(_text_pieces(tag))
+        memo = tag.__dict__["_er_text"] = _tidy_text(raw)
+    return memo
+
+def _tidy_text(txt: str) -> str:
     txt = re.sub(r"[ \t]+", " ", txt)
-    txt = re.sub(r"\n{3,}", "\n\n", txt).strip()
-    return txt
+    return re.sub(r"\n{3,}", "\n\n", txt).strip()
 
 def parse_title_from_href(href: str) -> str:
     if "/index.php" in href:
@@ -71,14 +892,139 @@ def pair_by_sequence(strings):
 
 # -------------------- 抓目录链接 --------------------
 
-def pick_first_n_items_unique(index_url: str, n: int = 3):
-    """从某“*一览”页里，抓首 n 个不重复的条目链接。"""
+class _Region:
+    """按同名标签计深度，跟踪一个元素是否还没闭合。"""
+    __slots__ = ("tag", "depth", "seen")
+
+    def __init__(self):
+        self.tag, self.depth, self.seen = "", 0, False
+
+    def open(self, tag: str):
+        self.tag, self.depth, self.seen = tag, 1, True
+
+    def start(self, tag: str):
+        if self.depth and tag == self.tag:
+            self.depth += 1
+
+    def end(self, tag: str) -> bool:
+        """返回本次是否恰好闭合。"""
+        if self.depth and tag == self.tag:
+            self.depth -= 1
+            return not self.depth
+        return False
+
+class _LinkScanner(HTMLParser):
+    """
+    流式收集 <a href> 及其文字（同 a.get_text(strip=True)）。正文区的选法同原先
+    select_one("#mw-content-text .mw-parser-output") or select_one(".mw-parser-output") or soup：
+    #mw-content-text 里的第一个 .mw-parser-output 边扫边交出，区域结束即 done；
+    在它之前出现的其它 .mw-parser-output（比如 #siteNotice 公告）只先记下，
+    扫完整页都没有首选区域时才退回它，再没有就退回全文所有链接。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.content = _Region()      # #mw-content-text
+        self.region = _Region()       # 首选正文区：#mw-content-text 里的第一个 .mw-parser-output
+        self.fallback = _Region()     # 页面里第一个 .mw-parser-output
+        self.done = False
+        self.links: list[tuple[str, str]] = []           # 首选正文区内、还没交出的链接
+        self.fallback_links: list[tuple[str, str]] = []
+        self.all_links: list[tuple[str, str]] = []       # 首选正文区出现前的全部链接
+        self._href: str | None = None
+        self._where = (False, False)                     # 当前 <a> 是否在 (首选区, 退回区) 里
+        self._text: list[str] = []
+        self._buf: list[str] = []
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._buf.append(data)
+
+    def _flush(self):
+        if self._buf:
+            s = "".join(self._buf).strip()
+            self._buf = []
+            if s:
+                self._text.append(s)
+
+    def close_link(self):
+        self._flush()
+        if self._href is not None:
+            link = (self._href, "".join(self._text))
+            in_region, in_fallback = self._where
+            if in_region:
+                self.links.append(link)
+            elif not self.region.seen:
+                self.all_links.append(link)
+                if in_fallback:
+                    self.fallback_links.append(link)
+            self._href, self._text = None, []
+
+    def take(self) -> list[tuple[str, str]]:
+        out, self.links = self.links, []
+        return out
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if self.done:
+            return
+        attrs = dict(attrs)
+        for r in (self.content, self.region, self.fallback):
+            r.start(tag)
+        if not self.content.depth and attrs.get("id") == "mw-content-text":
+            self.content.open(tag)
+        if "mw-parser-output" in (attrs.get("class") or "").split():
+            if self.content.depth and not self.region.seen:
+                self.region.open(tag)
+                self.all_links, self.fallback_links = [], []
+            elif not self.fallback.seen and not self.region.seen:
+                self.fallback.open(tag)
+        if tag == "a":
+            self.close_link()          # 没闭合的 <a> 遇到下一个 <a> 就算结束，和建树时一致
+            if "href" in attrs:
+                self._href = attrs["href"] or ""
+                self._where = (bool(self.region.depth), bool(self.fallback.depth))
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag == "a":
+            self.close_link()
+        self.content.end(tag)
+        self.fallback.end(tag)
+        if self.region.end(tag):
+            self.close_link()
+            self.done = True
+
+def iter_content_links(html: str, chunk_size: int = 64 * 1024):
+    """
+    按文档顺序产出正文区里的 (href, 链接文字)，边解析边交出：调用方拿够就停止迭代，
+    剩下的 HTML 不再解析；正文区结束也立即停止。正文区优先取 #mw-content-text 里的
+    .mw-parser-output；没有时退回页面里第一个 .mw-parser-output，再没有就是全文所有链接
+    （同原先 select_one(...) or select_one(...) or soup 的兜底），这两种情况要扫完整页才知道。
+    """
+    html = html_text(html)
+    sc = _LinkScanner()
+    for i in range(0, len(html), chunk_size):
+        sc.feed(html[i:i + chunk_size])
+        yield from sc.take()
+        if sc.done:
+            return
+    sc.close()
+    sc.close_link()
+    yield from sc.take()
+    if not sc.region.seen:
+        yield from (sc.fallback_links if sc.fallback.seen else sc.all_links)
+
+def iter_items_unique(index_url: str, n: int | None = None):
+    """从某“*一览”页里逐个产出不重复的条目 (名字, URL, 标题)；n 条后停止，n=None 时直到页尾。"""
+    if n is not None and n <= 0:
+        return
     base = "{u.scheme}://{u.netloc}".format(u=urlparse(index_url))
-    soup = soup_of(index_url)
-    content = soup.select_one("#mw-content-text .mw-parser-output") or soup.select_one(".mw-parser-output") or soup
-    found, seen_titles = [], set()
-    for a in content.find_all("a", href=True):
-        href = a["href"]
+    seen_titles, count = set(), 0
+    for href, text in iter_content_links(get_html(index_url)):
         if not is_item_link(href):
             continue
         title = parse_title_from_href(href).strip()
@@ -86,12 +1032,14 @@ def pick_first_n_items_unique(index_url: str, n: int = 3):
         if title in seen_titles or any(key in title for key in ("一览", "列表", "编辑", "最近更改", "特殊:")):
             continue
         seen_titles.add(title)
-        name = a.get_text(strip=True) or title
-        url = urljoin(base, href)
-        found.append((name, url, title))
-        if len(found) >= n:
-            break
-    return found
+        yield text or title, urljoin(base, href), title
+        count += 1
+        if n is not None and count >= n:
+            return
+
+def pick_first_n_items_unique(index_url: str, n: int | None = 3):
+    """从某“*一览”页里，抓首 n 个不重复的条目链接；n=None 时返回全部。"""
+    return list(iter_items_unique(index_url, n))
 
 
 # -------------------- 杂项 & 下载 --------------------
@@ -102,43 +1050,321 @@ def ensure_dir(p: pathlib.Path):
 def safe_filename(name: str) -> str:
     return re.sub(r"[\\/<>:\"|?*]+", "_", name).strip() or "unknown"
 
-def try_download(url: str) -> bytes | None:
+MAX_ICON_BYTES = int(os.getenv("ER_MAX_ICON_BYTES", str(5 * 1024 * 1024)))   # 单张图片的字节上限
+CHUNK_SIZE = 64 * 1024
+
+@staged("download", lambda meta, *_: meta["size"] if meta else 0)
+def download_to_file(url: str, dest: pathlib.Path, max_bytes: int = MAX_ICON_BYTES,
+                     timeout: float = 25.0, headers: dict | None = None) -> dict | None:
+    """
+    流式下载图片：分块写到同目录临时文件，校验通过后原子改名为 dest，内存占用与文件大小无关。
+    以下情况直接放弃、不动 dest：非 200、Content-Type 不是 image/*、
+    Content-Length 或实际字节数超过 max_bytes、正文一开头就是 HTML（错误页）、空文件。
+    headers 可带 If-None-Match 等条件头；服务器回 304 时同样不动 dest。
+    成功返回远端校验信息 {"etag","last_modified","size"[,"not_modified"]}，失败返回 None。
+    """
     try:
-        r = requests.get(url, headers=HEADERS, timeout=25)
-        r.raise_for_status()
-        return r.content
-    except Exception:
+        r = http_get(url, timeout=timeout, stream=True, headers=headers or {})
+    except requests.RequestException:
         return None
+    with r:
+        meta = {
+            "etag": r.headers.get("ETag", ""),
+            "last_modified": r.headers.get("Last-Modified", ""),
+            "size": 0,
+        }
+        if r.status_code == 304 and headers:
+            meta["not_modified"] = True
+            return meta
+        if r.status_code != 200:
+            return None
+        ctype = r.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if ctype and not ctype.startswith("image/"):
+            return None
+        length = r.headers.get("Content-Length", "")
+        if length.isdigit() and int(length) > max_bytes:
+            return None
+        ensure_dir(dest.parent)
+        tmp = _tmp_path(dest)
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    if size == 0 and ctype != "image/svg+xml" and chunk.lstrip()[:1] == b"<":
+                        raise ValueError("HTML 错误页")
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError("超出大小上限")
+                    f.write(chunk)
+            if size == 0:
+                raise ValueError("空文件")
+            os.replace(tmp, dest)
+            meta["size"] = size
+            return meta
+        except (OSError, ValueError, requests.RequestException):
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+            return None
+
+def file_sha256(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class BlobStore:
+    """
+    按内容寻址的图片仓库：.cache/blobs/<sha256 前两位>/<sha256><ext>，外加 URL → 内容索引
+    （sha256、扩展名，以及远端 ETag / Last-Modified / 字节数）。
+    - 已知 URL 直接命中本地 blob，不再下载；revalidate=True 时用条件请求确认远端没变（304）；
+    - 不同 URL 内容相同（如“居民头巾”与“居民头巾（轻装）”共用美术）只存一份；
+    - 条目目录里的 icon 文件是指向 blob 的硬链接（跨盘时退化为复制），Markdown 路径不变。
+    索引在进程退出时落盘。
+    """
+
+    def __init__(self, root: pathlib.Path = CACHE_DIR / "blobs"):
+        self.root = root
+        self.index_path = root / "index.json"
+        self.index: dict[str, dict] = load_json(self.index_path, {})
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._fresh: set[str] = set()   # 本轮已确认过的 URL，同一轮内不再重复条件请求
+
+    def path_for(self, digest: str, ext: str) -> pathlib.Path:
+        return self.root / digest[:2] / f"{digest}{ext}"
+
+    def lookup(self, url: str) -> pathlib.Path | None:
+        ent = self.index.get(url)
+        if not ent:
+            return None
+        p = self.path_for(ent["sha256"], ent["ext"])
+        return p if p.exists() else None
+
+    def _unchanged_by_size(self, url: str, size: int) -> bool:
+        """远端没给 ETag / Last-Modified 时，退而用 HEAD 的 Content-Length 比对。"""
+        try:
+            r = http_request("HEAD", url, timeout=10, allow_redirects=True)
+        except requests.RequestException:
+            return True   # 探测失败就先用本地这份
+        return r.status_code == 200 and r.headers.get("Content-Length", "") == str(size)
+
+    def fetch(self, url: str, max_bytes: int = MAX_ICON_BYTES, revalidate: bool = False) -> pathlib.Path | None:
+        """返回 url 对应的 blob；本地没有（或 revalidate 发现远端变了）才下载。"""
+        p = self.lookup(url)
+        ent = self.index.get(url, {})
+        headers = {}
+        if p:
+            if not revalidate or url in self._fresh:
+                return p
+            if ent.get("etag"):
+                headers["If-None-Match"] = ent["etag"]
+            elif ent.get("last_modified"):
+                headers["If-Modified-Since"] = ent["last_modified"]
+            elif self._unchanged_by_size(url, ent.get("size", -1)):
+                self._fresh.add(url)
+                return p
+        ext = os.path.splitext(urlparse(url).path)[1] or ".png"
+        tmp = _tmp_path(self.root / "incoming" / hashlib.sha256(url.encode("utf-8")).hexdigest())
+        meta = download_to_file(url, tmp, max_bytes=max_bytes, headers=headers)
+        if not meta:
+            return p      # 下载失败时旧 blob 仍可用
+        if meta.get("not_modified"):
+            self._fresh.add(url)
+            return p
+        digest = file_sha256(tmp)
+        blob = self.path_for(digest, ext)
+        ensure_dir(blob.parent)
+        if blob.exists():
+            tmp.unlink()          # 内容已存在：去重
+        else:
+            os.replace(tmp, blob)
+        with self._lock:
+            self.index[url] = {"sha256": digest, "ext": ext, "etag": meta["etag"],
+                               "last_modified": meta["last_modified"], "size": meta["size"]}
+            self._dirty = True
+            self._fresh.add(url)
+        return blob
+
+    def save(self):
+        with self._lock:
+            if self._dirty:
+                save_json(self.index_path, self.index)
+                self._dirty = False
+
+def link_file(src: pathlib.Path, dest: pathlib.Path):
+    """dest 指向 src 的同一份内容：优先硬链接，不支持时复制。"""
+    ensure_dir(dest.parent)
+    tmp = _tmp_path(dest)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+class SyncSet:
+    """
+    增量同步：记下本轮写过/确认过的文件（或整个目录），跑完后只删 roots 下没被记到的孤儿文件，
+    取代“先清空仓库再全部重下”。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.kept: set[str] = set()
+
+    @staticmethod
+    def _key(path: pathlib.Path) -> str:
+        return os.path.abspath(path)
+
+    def keep(self, path: pathlib.Path):
+        with self._lock:
+            self.kept.add(self._key(path))
+
+    def is_kept(self, path: pathlib.Path) -> bool:
+        p = self._key(path)
+        while True:
+            if p in self.kept:
+                return True
+            parent = os.path.dirname(p)
+            if parent == p:
+                return False
+            p = parent
+
+    def prune(self, roots: list[pathlib.Path]) -> list[pathlib.Path]:
+        removed = []
+        for root in roots:
+            if not root.is_dir():
+                continue
+            for p in sorted(root.rglob("*"), reverse=True):
+                if p.is_file() and not self.is_kept(p):
+                    p.unlink()
+                    removed.append(p)
+                elif p.is_dir() and not any(p.iterdir()):
+                    p.rmdir()
+        return removed
+
+BLOBS = BlobStore()
+atexit.register(BLOBS.save)
+SYNC = SyncSet()
+
+def fetch_asset(url: str, dest: pathlib.Path, revalidate: bool = False) -> bool:
+    """
+    经内容寻址仓库取图并落到 dest；已下载过的 URL 不再走网络（revalidate 时只发条件请求）。
+    dest 已经是同一内容（硬链接或哈希一致）时不重写。成功后 dest 记入 SYNC。
+    """
+    blob = BLOBS.fetch(url, revalidate=revalidate)
+    if not blob:
+        return False
+    try:
+        same = dest.exists() and (os.path.samefile(blob, dest) or file_sha256(dest) == blob.stem)
+    except OSError:
+        same = False
+    if not same:
+        link_file(blob, dest)
+    SYNC.keep(dest)
+    return True
+
+ICON_SIZES = ("160", "120", "80")
+ICON_CHOICES_FILE = CACHE_DIR / "icon_sizes.json"
+_icon_choices: dict[str, str] = load_json(ICON_CHOICES_FILE, {})   # 图片文件（去掉尺寸）-> 确认可用的 URL
+_icon_lock = threading.Lock()
+_probe_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="icon-probe")
+
+def _icon_key(url: str) -> str:
+    return re.sub(r"/\d+px-", "/", urlparse(url).path)
+
+def _save_icon_choices():
+    with _icon_lock:
+        if _icon_choices:
+            save_json(ICON_CHOICES_FILE, _icon_choices)
+
+atexit.register(_save_icon_choices)
+
+def probe_url(url: str) -> bool:
+    """HEAD 探测该尺寸的缩略图是否存在（只看状态码和类型，不下正文）。"""
+    try:
+        r = http_request("HEAD", url, timeout=10, allow_redirects=True)
+    except requests.RequestException:
+        return False
+    ctype = r.headers.get("Content-Type", "")
+    return r.status_code == 200 and (not ctype or ctype.startswith("image/"))
+
+def icon_candidates(url: str, sizes=ICON_SIZES) -> list[str]:
+    """
+    原始 src 加上 sizes 里其它尺寸的缩略图 URL，按优先级排好；
+    已确认可用的那个排到最前：先看上次记住的选择、再看内容仓库里已有的 URL。
+    这里不发请求，取图与回落见 fetch_icon。
+    """
+    cands = [url]
+    m = re.search(r"/(\d+)px-", url)
+    if m:
+        size = m.group(1)
+        for sz in sizes:
+            if sz != size:
+                cands.append(url.replace(f"/{size}px-", f"/{sz}px-"))
+    if len(cands) == 1:
+        return cands
+
+    chosen = _icon_choices.get(_icon_key(url))
+    if chosen not in cands:
+        chosen = next((c for c in cands if BLOBS.lookup(c)), None)
+    if chosen is None:
+        return cands
+    return [chosen] + [c for c in cands if c != chosen]
+
+def fetch_icon(url: str, out_dir: pathlib.Path, sizes=ICON_SIZES, revalidate: bool = False) -> pathlib.Path | None:
+    """
+    取图标到 out_dir/icon.<ext>，返回落盘路径；全部尺寸都取不到返回 None。
+    先直接 GET 首选（多数情况就是原始 src），一次请求搞定；失败了才对其余尺寸并发发 HEAD，
+    按优先级 GET 存在的那个（探测全失败，比如 CDN 不支持 HEAD，就逐个 GET）。
+    用上的不是原始 src 时记住，下次直接排到最前。
+    """
+    cands = icon_candidates(url, sizes)
+
+    def get(c: str) -> pathlib.Path | None:
+        ext = os.path.splitext(urlparse(c).path)[1] or ".png"
+        fpath = out_dir / f"icon{ext}"
+        return fpath if fetch_asset(c, fpath, revalidate=revalidate) else None
+
+    fpath = get(cands[0])
+    rest = cands[1:]
+    if fpath is None and rest:
+        oks = list(_probe_pool.map(probe_url, rest))
+        for c in [c for c, ok in zip(rest, oks) if ok] or rest:
+            fpath = get(c)
+            if fpath is not None:
+                if c != url:
+                    with _icon_lock:
+                        _icon_choices[_icon_key(url)] = c
+                break
+    return fpath
+
+# 设为 0 时解析器不下载图标，icon_rel 记原始图片 URL（对拍解析结果、跑基准时用）
+DOWNLOAD_ICONS = os.getenv("ER_DOWNLOAD_ICONS", "1") != "0"
 
 def download_icon_from_table(table, out_dir: pathlib.Path) -> str:
     """
     表格右侧的大图通常有 class=img-equip；若无，就取表格里第一张图。
     返回保存后的相对路径（posix）。
     """
-    ensure_dir(out_dir)
     img = table.select_one("img.img-equip") or table.select_one("img")
-    if not img or not img.get("src"):
+    return download_icon(img.get("src") if img else "", out_dir)
+
+@staged("icon", lambda rel, *_: file_size(rel) if DOWNLOAD_ICONS else 0)
+def download_icon(src: str, out_dir: pathlib.Path) -> str:
+    """按图片 src 下载图标到 out_dir/icon.<ext>；返回相对路径（posix），失败或无图返回空串。"""
+    if not src:
         return ""
-    src = img["src"]
     u = ("https:" + src) if src.startswith("//") else src
-    # 尝试 120px/160px 回落
-    cands = [u]
-    m = re.search(r"/(\d+)px-", u)
-    if m:
-        size = m.group(1)
-        for sz in ("160", "120", "80"):
-            if sz != size:
-                cands.append(u.replace(f"/{size}px-", f"/{sz}px-"))
-    for uu in cands:
-        content = try_download(uu)
-        if content:
-            ext = os.path.splitext(urlparse(uu).path)[1] or ".png"
-            fpath = out_dir / f"icon{ext}"
-            with open(fpath, "wb") as f:
-                f.write(content)
-            # 转 posix，避免 Windows 反斜杠弄坏 Markdown
-            return pathlib.Path(os.path.relpath(fpath)).as_posix()
-    return ""
+    if not DOWNLOAD_ICONS:
+        return u
+    ensure_dir(out_dir)
+    # 原始 src 取不到时回落 160px/120px/80px
+    fpath = fetch_icon(u, out_dir)
+    # 转 posix，避免 Windows 反斜杠弄坏 Markdown
+    return pathlib.Path(os.path.relpath(fpath)).as_posix() if fpath else ""
 
 
 # -------------------- 基础提取 & 共同字段 --------------------
@@ -155,33 +1381,146 @@ def extract_block_after_title(rows, i, title_text) -> tuple[str, int]:
             return txt, i + 1
     return txt, i
 
-def extract_fp_weight_lines(table) -> tuple[str, str, list[str]]:
+class RowIndex:
     """
-    从“信息卡”左单元格抽“类型行/战技名”等，并解析 FP、重量：
-    - 先复制左 td，把 style 里 float:right 的数字块删掉，避免把“3（-/-）/3.5”误当一行；
-    - 再从整表文本用正则兜底解析 FP/重量。
+    信息卡的行标签索引：一次遍历全部 <tr>，建好 {行文本.strip(): [行号, ...]}，
+    各字段按候选标签 O(1) 查到标题行，再取下一行首个 td，不再每行×每个标签重算一次行文本。
+    多处命中时取表里最靠后且内容非空的一处，与原先逐行扫描“后者覆盖前者”一致。
+    索引按原先的游标走一遍建：每步先看 headers（含齐一组关键字的表头行，下一行是数值），
+    再按 fields 的顺序逐个比标题（strip 后全等），命中就把游标移到正文行，正文行不再当标题行看；
+    每步的起始行记在 label_rows，记忆空格之类的行内字段只在这些行上找。
     """
-    fp = wt = ""
-    type_lines = []
 
-    # 找到“左半块”td
-    left_td = None
+    def __init__(self, table, fields=(), headers=()):
+        self.rows = table.find_all("tr")
+        self._index([text_with_newlines(tr) for tr in self.rows], fields, headers)
+
+    def _index(self, texts: list[str], fields=(), headers=()):
+        self.texts = texts
+        titles = [t for _field, group in fields for t in group]
+        self.label_rows: list[int] = []
+        self.labels: dict[str, list[int]] = {}
+        pos = 0
+        while pos < len(texts):
+            self.label_rows.append(pos)
+            if any(all(n in texts[pos] for n in h) for h in headers):
+                pos += 1
+            for t in titles:
+                if pos < len(texts) and texts[pos].strip() == t:
+                    self.labels.setdefault(t, []).append(pos)
+                    pos += 1
+            pos += 1
+
+    def tds(self, pos: int) -> list:
+        """第 pos 行的 td（不含 th）；越界返回空列表。"""
+        return self.rows[pos].find_all("td") if 0 <= pos < len(self.rows) else []
+
+    @staticmethod
+    def cell_text(td) -> str:
+        return text_with_newlines(td)
+
+    def block_at(self, i: int, title: str) -> tuple[str, int]:
+        """逐行游标版（武器卡用）：第 i 行 == title 时取下一行首格文本并前移一行，同 extract_block_after_title。"""
+        if i < len(self.texts) and self.texts[i].strip() == title:
+            tds = self.tds(i + 1)
+            return (self.cell_text(tds[0]) if tds else ""), i + 1
+        return "", i
+
+    def cell_after(self, pos: int):
+        """标题行 pos 的下一行首个 td；没有则 None。"""
+        return self.rows[pos + 1].find("td") if pos + 1 < len(self.rows) else None
+
+    def block_after(self, *titles: str) -> str:
+        """任一标题行的下一行首格文本；没有则返回空串。"""
+        hits = sorted((pos for t in titles for pos in self.labels.get(t, ())), reverse=True)
+        for pos in hits:
+            td = self.cell_after(pos)
+            txt = self.cell_text(td) if td is not None else ""
+            if txt:
+                return txt
+        return ""
+
+    def fill(self, data: dict, fields) -> dict:
+        """按 ((字段, (候选标题, ...)), ...) 把非空的块写进 data。"""
+        for field, titles in fields:
+            txt = self.block_after(*titles)
+            if txt:
+                data[field] = txt
+        return data
+
+    def cells_after(self, *needles: str, count: int | None = None) -> list:
+        """
+        最后一个同时含全部 needles 的标题行，其下一行的 td 列表；下一行没有 td
+        （或给了 count 而个数不符）的不算，和原先“取不到就保留前面的值”一致。
+        """
+        for pos in reversed(self.label_rows):
+            if all(n in self.texts[pos] for n in needles):
+                tds = self.tds(pos + 1)
+                if tds and (count is None or len(tds) == count):
+                    return tds
+        return []
+
+def _is_floated(tag) -> bool:
+    return "float:right" in (tag.get("style") or "")
+
+def find_left_td(table, min_strings: int = 1):
+    """信息卡里第一个“恰好两格”的行的左格（至少 min_strings 段文字）。"""
     for tr in table.find_all("tr"):
         tds = tr.find_all("td")
-        if len(tds) == 2 and len(list(tds[0].stripped_strings)) >= 1:
-            left_td = tds[0]
-            break
-    if left_td:
-        left_clone = BeautifulSoup(str(left_td), "html.parser")
-        for n in left_clone.select('[style*="float:right"]'):
-            n.decompose()
-        raw = [ln.strip() for ln in text_with_newlines(left_clone).splitlines() if ln.strip()]
-        for ln in raw:
-            if ln.startswith("消耗专注值") or ln.startswith("重量"):
+        if len(tds) == 2 and next(islice(tds[0].stripped_strings, min_strings - 1, None), None) is not None:
+            return tds[0]
+    return None
+
+def scan_info_table(table, left_td=None) -> tuple[str, list[str]]:
+    """
+    一次遍历整张信息卡，同时得到：
+    - 整表文本（与 text_with_newlines(table) 相同，供正则取 FP/重量/品质）；
+    - 左格的行（原地跳过 style 含 float:right 的数值块，不复制、不重新建树）。
+    不改动原树。
+    """
+    types = table.interesting_string_types or Tag.MAIN_CONTENT_STRING_TYPES
+    full, left = [], []
+
+    def walk(node, in_left: bool):
+        for child in node.children:
+            if isinstance(child, NavigableString):
+                if type(child) not in types:
+                    continue
+                s = child.strip()
+                if s:
+                    full.append(s)
+                    if in_left:
+                        left.append(s)
                 continue
-            type_lines.append(ln)
+            inside = in_left or child is left_td
+            # 浮动块内的文字仍属于整表文本，只是不算进左格
+            walk(child, inside and not _is_floated(child))
+
+    walk(table, False)
+    return _tidy_text("\n".join(full)), _split_lines(left)
+
+def _split_lines(pieces) -> list[str]:
+    lines = []
+    for piece in pieces:
+        for ln in piece.splitlines():
+            ln = re.sub(r"[ \t]+", " ", ln).strip()
+            if ln:
+                lines.append(ln)
+    return lines
+
+def extract_fp_weight_lines(table) -> tuple[str, str, list[str]]:
+    """
+    从“信息卡”左单元格抽“类型行/战技名”等，并解析 FP、重量：
+    - 一次遍历整表，左格里 style 含 float:right 的数字块原地跳过，避免把“3（-/-）/3.5”误当一行；
+    - 同一遍得到的整表文本用正则兜底解析 FP/重量。
+    """
+    return _fp_weight_lines(*scan_info_table(table, find_left_td(table)))
+
+def _fp_weight_lines(full: str, raw: list[str]) -> tuple[str, str, list[str]]:
+    """整表文本 + 左格行 -> (FP, 重量, 类型行)；BeautifulSoup 与快速通道共用。"""
+    fp = wt = ""
+    type_lines = [ln for ln in raw if not (ln.startswith("消耗专注值") or ln.startswith("重量"))]
 
-    full = text_with_newlines(table)
     m = re.search(r"(?:消耗专注值|FP)\s*([^\n\r]+)", full)
     if m:
         fp = m.group(1).strip()
@@ -197,8 +1536,26 @@ def extract_fp_weight_lines(table) -> tuple[str, str, list[str]]:
 
 # -------------------- 各分类解析器 --------------------
 
+# “标题行 + 下一行正文”形式的字段：分类 -> ((字段, (候选标题, ...)), ...)
+LOCATION_TITLES = ("获取地点", "获取途径", "获得方法")
+ROW_FIELDS = {
+    "armors": (("location", ("获取途径",)), ("intro", ("简介",))),
+    "talismans": (("effect", ("效果",)), ("side_effect", ("负面效果",)),
+                  ("location", ("获取地点",)), ("intro", ("简介",))),
+    "items": (("effect", ("效果", "用途", "使用效果", "道具效用")),
+              ("location", LOCATION_TITLES), ("intro", ("简介",))),
+    "spells": (("intro", ("效果", "说明", "简介")), ("location", LOCATION_TITLES)),
+    "ashes": (("effect", ("道具效用", "效果", "说明")),
+              ("inject", ("可注入武器", "可附着武器", "派生")), ("location", LOCATION_TITLES)),
+}
+# 下一行是数值表的表头行：分类 -> ((关键字, ...), ...)，行里含齐一组关键字即算
+ROW_HEADERS = {
+    "armors": (("减伤率", "抵抗力"),),
+    "spells": (("必需能力值",),),
+}
+
 def parse_weapon(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = {"category": "weapons"}
     data["name"] = (soup.select_one("h1.firstHeading") or soup.find("h1")).get_text(strip=True)
 
@@ -207,33 +1564,36 @@ def parse_weapon(html: str) -> dict:
         return data
 
     data["icon_rel"] = download_icon_from_table(table, pathlib.Path("assets/weapons") / safe_filename(data["name"]))
-    fp, wt, lines = extract_fp_weight_lines(table)
+    return _weapon_fields(data, RowIndex(table), extract_fp_weight_lines(table))
+
+def _weapon_fields(data: dict, idx: RowIndex, fp_wt_lines) -> dict:
+    """武器信息卡各字段；BeautifulSoup 与快速通道共用（idx 可以是 RowIndex 或 CardRows）。"""
+    fp, wt, lines = fp_wt_lines
     data["type_lines"] = [ln for ln in lines]  # 可能含“战技名”
     data["fp"] = fp
     data["weight"] = wt
 
-    rows = table.find_all("tr")
     i = 0
-    while i < len(rows):
-        rtxt = text_with_newlines(rows[i])
+    while i < len(idx.texts):
+        rtxt = idx.texts[i]
         if "攻击力" in rtxt and "减伤率" in rtxt:
-            tds = rows[i+1].find_all("td") if i + 1 < len(rows) else []
+            tds = idx.tds(i + 1)
             if len(tds) == 2:
                 data["attack"] = pair_by_sequence(list(tds[0].stripped_strings))
                 data["guard"]  = pair_by_sequence(list(tds[1].stripped_strings))
             i += 1
         if "能力加成" in rtxt and "必需能力值" in rtxt:
-            tds = rows[i+1].find_all("td") if i + 1 < len(rows) else []
+            tds = idx.tds(i + 1)
             if len(tds) == 2:
                 data["scaling"] = pair_by_sequence(list(tds[0].stripped_strings))
                 data["reqs"]    = pair_by_sequence(list(tds[1].stripped_strings))
             i += 1
 
-        txt, i = extract_block_after_title(rows, i, "附加效果")
+        txt, i = idx.block_at(i, "附加效果")
         if txt: data["extra"] = txt
-        txt, i = extract_block_after_title(rows, i, "简介")
+        txt, i = idx.block_at(i, "简介")
         if txt: data["intro"] = txt
-        txt, i = extract_block_after_title(rows, i, "获取地点")
+        txt, i = idx.block_at(i, "获取地点")
         if txt: data["location"] = txt
 
         # “专属战技-xxx”
@@ -242,12 +1602,12 @@ def parse_weapon(html: str) -> dict:
             m = re.match(r"专属战技[-：:]\s*(.+)", t)
             if m:
                 data["ash_name"] = m.group(1).strip()
-            desc, i2 = extract_block_after_title(rows, i, t)
+            desc, i2 = idx.block_at(i, t)
             if desc:
                 data["ash_desc"] = desc
                 i = i2
         if t == "武器使用强化石类型":
-            txt, i = extract_block_after_title(rows, i, t)
+            txt, i = idx.block_at(i, t)
             if txt: data["upgrade"] = txt
 
         i += 1
@@ -255,7 +1615,7 @@ def parse_weapon(html: str) -> dict:
 
 
 def parse_armor(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = {"category": "armors"}
     data["name"] = (soup.select_one("h1.firstHeading") or soup.find("h1")).get_text(strip=True)
 
@@ -264,34 +1624,25 @@ def parse_armor(html: str) -> dict:
         return data
 
     data["icon_rel"] = download_icon_from_table(table, pathlib.Path("assets/armors") / safe_filename(data["name"]))
+    return _armor_fields(data, RowIndex(table, ROW_FIELDS["armors"], ROW_HEADERS["armors"]),
+                         extract_fp_weight_lines(table))
+
+def _armor_fields(data: dict, idx: RowIndex, fp_wt_lines) -> dict:
     # 盔甲没有 FP，保留重量 + 左列几行作为“类型信息”
-    fp, wt, lines = extract_fp_weight_lines(table)
+    fp, wt, lines = fp_wt_lines
     data["type_lines"] = [ln for ln in lines]      # 如：头盔/轻/中/重 等文本行（有则保留）
     data["weight"]     = wt
 
-    rows = table.find_all("tr")
-    i = 0
-    while i < len(rows):
-        rtxt = text_with_newlines(rows[i])
-
-        if "减伤率" in rtxt and "抵抗力" in rtxt:
-            tds = rows[i+1].find_all("td") if i + 1 < len(rows) else []
-            if len(tds) == 2:
-                data["defence"] = pair_by_sequence(list(tds[0].stripped_strings))
-                data["resist"]  = pair_by_sequence(list(tds[1].stripped_strings))
-            i += 1
-
-        txt, i = extract_block_after_title(rows, i, "获取途径")
-        if txt: data["location"] = txt
-        txt, i = extract_block_after_title(rows, i, "简介")
-        if txt: data["intro"] = txt
-
-        i += 1
+    tds = idx.cells_after("减伤率", "抵抗力", count=2)
+    if tds:
+        data["defence"] = pair_by_sequence(list(tds[0].stripped_strings))
+        data["resist"]  = pair_by_sequence(list(tds[1].stripped_strings))
+    idx.fill(data, ROW_FIELDS["armors"])
     return data
 
 
 def parse_talisman(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = {"category": "talismans"}
     data["name"] = (soup.select_one("h1.firstHeading") or soup.find("h1")).get_text(strip=True)
 
@@ -303,27 +1654,13 @@ def parse_talisman(html: str) -> dict:
     data["type_lines"] = [ln for ln in lines]
     data["weight"] = wt
 
-    rows = table.find_all("tr")
-    i = 0
-    while i < len(rows):
-        rtxt = text_with_newlines(rows[i])
-
-        txt, i = extract_block_after_title(rows, i, "效果")
-        if txt: data["effect"] = txt
-        txt, i = extract_block_after_title(rows, i, "负面效果")
-        if txt: data["side_effect"] = txt
-        txt, i = extract_block_after_title(rows, i, "获取地点")
-        if txt: data["location"] = txt
-        txt, i = extract_block_after_title(rows, i, "简介")
-        if txt: data["intro"] = txt
-
-        i += 1
+    RowIndex(table, ROW_FIELDS["talismans"]).fill(data, ROW_FIELDS["talismans"])
     return data
 
 
 def parse_item(html: str) -> dict:
     """普通消耗/素材等道具。"""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = {"category": "items"}
     data["name"] = (soup.select_one("h1.firstHeading") or soup.find("h1")).get_text(strip=True)
 
@@ -335,28 +1672,13 @@ def parse_item(html: str) -> dict:
     data["type_lines"] = [ln for ln in lines]
     data["weight"] = wt
 
-    rows = table.find_all("tr")
-    i = 0
-    while i < len(rows):
-        rtxt = text_with_newlines(rows[i])
-        for key in ("效果", "用途", "使用效果", "道具效用"):
-            txt, i = extract_block_after_title(rows, i, key)
-            if txt:
-                data["effect"] = txt
-        for key in ("获取地点", "获取途径", "获得方法"):
-            txt, i = extract_block_after_title(rows, i, key)
-            if txt:
-                data["location"] = txt
-        txt, i = extract_block_after_title(rows, i, "简介")
-        if txt: data["intro"] = txt
-
-        i += 1
+    RowIndex(table, ROW_FIELDS["items"]).fill(data, ROW_FIELDS["items"])
     return data
 
 
 def parse_spell(html: str) -> dict:
     """法术（魔法/祷告）"""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = {"category": "spells"}
     data["name"] = (soup.select_one("h1.firstHeading") or soup.find("h1")).get_text(strip=True)
 
@@ -368,37 +1690,22 @@ def parse_spell(html: str) -> dict:
     data["type_lines"] = [ln for ln in lines]
     data["fp"] = fp
 
-    rows = table.find_all("tr")
-    i = 0
-    while i < len(rows):
-        rtxt = text_with_newlines(rows[i])
-        # 记忆空格 / 必需能力值 常见
-        m = re.search(r"记忆空格[:：]?\s*([^\n]+)", rtxt)
+    idx = RowIndex(table, ROW_FIELDS["spells"], ROW_HEADERS["spells"])
+    # 记忆空格 / 必需能力值 常见；只看标题行，正文里提到“记忆空格”不算
+    for pos in idx.label_rows:
+        m = re.search(r"记忆空格[:：]?\s*([^\n]+)", idx.texts[pos])
         if m: data["slots"] = m.group(1).strip()
+    tds = idx.cells_after("必需能力值")
+    if tds:
+        data["reqs"] = pair_by_sequence(list(tds[0].stripped_strings))
 
-        if "必需能力值" in rtxt:
-            tds = rows[i+1].find_all("td") if i + 1 < len(rows) else []
-            if tds:
-                data["reqs"] = pair_by_sequence(list(tds[0].stripped_strings))
-            i += 1
-
-        for key in ("效果", "说明", "简介"):
-            txt, i = extract_block_after_title(rows, i, key)
-            if txt:
-                data["intro"] = txt
-
-        for key in ("获取地点", "获取途径", "获得方法"):
-            txt, i = extract_block_after_title(rows, i, key)
-            if txt:
-                data["location"] = txt
-
-        i += 1
+    idx.fill(data, ROW_FIELDS["spells"])
     return data
 
 
 def parse_ash(html: str) -> dict:
     """战灰"""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_page_soup(html)
     data = {"category": "ashes"}
     data["name"] = (soup.select_one("h1.firstHeading") or soup.find("h1")).get_text(strip=True)
 
@@ -410,28 +1717,348 @@ def parse_ash(html: str) -> dict:
     data["type_lines"] = [ln for ln in lines]
     data["fp"] = fp
 
-    rows = table.find_all("tr")
-    i = 0
-    while i < len(rows):
-        rtxt = text_with_newlines(rows[i])
+    RowIndex(table, ROW_FIELDS["ashes"]).fill(data, ROW_FIELDS["ashes"])
+    return data
 
-        for key in ("道具效用", "效果", "说明"):
-            txt, i = extract_block_after_title(rows, i, key)
-            if txt:
-                data["effect"] = txt
 
-        for key in ("可注入武器", "可附着武器", "派生"):
-            txt, i = extract_block_after_title(rows, i, key)
-            if txt:
-                data["inject"] = txt
+# -------------------- 快速通道：流式抽信息卡（武器/防具） --------------------
+
+# 常见版式的武器/防具页不建树：HTMLParser 流式扫一遍，只记标题和第一张信息卡的行/格文字；
+# 结构自检不过就透明回退到上面的 BeautifulSoup 解析器。ER_FAST_PATH=0 关掉
+FAST_PATH = os.getenv("ER_FAST_PATH", "1") != "0"
+_fast = FAST_PATH
+FAST_STATS: dict[str, list[int]] = {}   # 分类 -> [快速通道命中, 回退]
+_fast_lock = threading.Lock()
+
+_VOID_TAGS = frozenset("area base br col embed hr img input link meta param source track wbr".split())
+# 这些标签里的文字在 BeautifulSoup 里不是普通字符串（get_text 不取），信息卡里出现就不走快速通道
+_SPECIAL_TEXT_TAGS = frozenset(("script", "style", "template", "rt", "rp"))
+_TABLE_PARTS = frozenset(("tbody", "thead", "tfoot"))
+# lxml 遇到这些开始标签会先隐式关掉 <p>，html.parser 不会；段落里出现就不走快速通道
+_P_CLOSERS = frozenset("address article aside blockquote center details dialog dir div dl dd dt fieldset figcaption "
+                       "figure footer form h1 h2 h3 h4 h5 h6 header hgroup hr li main menu nav ol p pre section "
+                       "summary table ul".split())
+
+def set_fast_path(flag: bool):
+    """切换快速通道；子进程通过环境变量继承。"""
+    global _fast
+    _fast = bool(flag)
+    os.environ["ER_FAST_PATH"] = "1" if _fast else "0"
+
+def take_fast_stats() -> dict[str, list[int]]:
+    """取走并清零本进程的命中/回退计数（解析子进程随结果带回主进程）。"""
+    with _fast_lock:
+        out = {cat: list(v) for cat, v in FAST_STATS.items()}
+        FAST_STATS.clear()
+    return out
 
-        for key in ("获取地点", "获取途径", "获得方法"):
-            txt, i = extract_block_after_title(rows, i, key)
-            if txt:
-                data["location"] = txt
+def merge_fast_stats(stats: dict[str, list[int]]):
+    with _fast_lock:
+        for cat, (hit, miss) in stats.items():
+            total = FAST_STATS.setdefault(cat, [0, 0])
+            total[0] += hit
+            total[1] += miss
 
-        i += 1
-    return data
+def fast_path_stats() -> dict[str, dict[str, int]]:
+    """{分类: {"hit": 命中, "fallback": 回退}}，写运行报告用。"""
+    with _fast_lock:
+        return {cat: {"hit": hit, "fallback": miss} for cat, (hit, miss) in sorted(FAST_STATS.items())}
+
+def fast_path_summary() -> str:
+    with _fast_lock:
+        parts = [f"{cat} {hit}/{hit + miss}" for cat, (hit, miss) in sorted(FAST_STATS.items())]
+    return "快速通道命中: " + ("，".join(parts) if parts else "无")
+
+class CardCell:
+    """信息卡的一格：pieces 为全部非空文字段，plain 为去掉 float:right 块后的文字段。"""
+    __slots__ = ("name", "pieces", "plain")
+
+    def __init__(self, name: str):
+        self.name, self.pieces, self.plain = name, [], []
+
+    @property
+    def stripped_strings(self):
+        return iter(self.pieces)
+
+class CardRows(RowIndex):
+    """流式抽出的信息卡，接口同 RowIndex，供 _weapon_fields/_armor_fields 共用。"""
+
+    def __init__(self, rows: list[tuple[list[str], list[CardCell]]], fields=(), headers=()):
+        self.rows = rows
+        self._index([_tidy_text("\n".join(pieces)) for pieces, _cells in rows], fields, headers)
+
+    def left_lines(self, min_strings: int = 1) -> list[str]:
+        """同 find_left_td + scan_info_table：第一个恰好两格、左格至少 min_strings 段文字的行，左格去掉浮动块后的行。"""
+        left = next((tds[0] for tds in (self.tds(i) for i in range(len(self.rows)))
+                     if len(tds) == 2 and len(tds[0].pieces) >= min_strings), None)
+        return _split_lines(left.plain) if left else []
+
+    def tds(self, pos: int) -> list:
+        return [c for c in self.rows[pos][1] if c.name == "td"] if 0 <= pos < len(self.rows) else []
+
+    @staticmethod
+    def cell_text(td) -> str:
+        return _tidy_text("\n".join(td.pieces))
+
+    def cell_after(self, pos: int):
+        tds = self.tds(pos + 1)
+        return tds[0] if tds else None
+
+class _StopScan(Exception):
+    pass
+
+class InfoCardScanner(HTMLParser):
+    """
+    流式扫描条目页：记下 h1.firstHeading 文字和 .mw-parser-output 里第一张 table.wikitable 的
+    行/格文字段、图片 src；want_para 时还记下 .mw-parser-output 里第一个 <p> 的文字段。
+    拿齐就提前停止。文字段与 BeautifulSoup 的 stripped_strings 一一对应。
+    结构自检：信息卡内标签必须严格配对、行/格层级正确、无表中表、无游离文字、无脚本类标签；
+    段落内标签严格配对、不含会隐式关掉 <p> 的块级标签，正文区里也不能有多余的 </p>。
+    任一不满足 ok=False，由调用方回退。
+    """
+
+    def __init__(self, want_para: bool = False):
+        super().__init__(convert_charrefs=True)
+        self.ok = True
+        self.want_para = want_para
+        self.para_pieces: list[str] | None = None     # 没找到 <p> 时为 None
+        self.para_stack: list[str] = []               # 段落内打开的标签，底部是 p
+        self.para_done = False
+        self.name_pieces: list[str] | None = None
+        self.h1_depth = 0
+        self.content_tag, self.content_depth = "", 0
+        self.stack: list[tuple[str, bool]] = []    # 信息卡内打开的标签 (名字, 是否浮动)
+        self.table_done = False
+        self.table_pieces: list[str] = []
+        self.rows: list[tuple[list[str], list[CardCell]]] = []
+        self.row = self.cell = None
+        self.floated = 0
+        self.first_img = self.equip_img = None
+        self._buf: list[str] = []
+
+    def fail(self):
+        self.ok = False
+        raise _StopScan
+
+    # 相邻文字先攒着，遇到任何标签/注释再成段，和 BeautifulSoup 合并 NavigableString 的方式一致
+    def handle_data(self, data):
+        self._buf.append(data)
+
+    def _flush(self):
+        if not self._buf:
+            return
+        text, self._buf = "".join(self._buf), []
+        s = text.strip()
+        if not s:
+            return
+        if self.h1_depth:
+            self.name_pieces.append(s)
+        if self.para_stack:
+            self.para_pieces.append(s)
+        if self.stack:
+            if self.cell is None and self.stack[-1][0] in ("table", "tr", *_TABLE_PARTS):
+                self.fail()       # 游离在行/格之外的文字，各后端摆放位置不同
+            self.table_pieces.append(s)
+            if self.row is not None:
+                self.row[0].append(s)
+            if self.cell is not None:
+                self.cell.pieces.append(s)
+                if not self.floated:
+                    self.cell.plain.append(s)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if self.stack or self.h1_depth or self.para_stack:
+            self.fail()           # CDATA 段：html.parser 当文字，lxml 丢弃
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            self.handle_starttag(tag, attrs)
+        elif self.stack or self.h1_depth or self.para_stack:
+            self._flush()
+            self.fail()           # <span/> 这类写法 lxml 与 html.parser 理解不同
+        else:
+            self.handle_starttag(tag, attrs)
+            self.handle_endtag(tag)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        attrs = {k: (v or "") for k, v in attrs}
+        classes = attrs.get("class", "").split()
+        if self.h1_depth:
+            if tag in _SPECIAL_TEXT_TAGS:
+                self.fail()
+            if tag == "h1":
+                self.h1_depth += 1
+        elif tag == "h1" and self.name_pieces is None and "firstHeading" in classes:
+            self.name_pieces, self.h1_depth = [], 1
+        if self.para_stack:
+            if tag in _SPECIAL_TEXT_TAGS or tag in _P_CLOSERS:
+                self.fail()
+            if tag not in _VOID_TAGS:
+                self.para_stack.append(tag)
+        elif tag == "p" and self.content_depth and self.want_para and not self.para_done:
+            self.para_pieces, self.para_stack = [], ["p"]
+        if self.content_depth:
+            if tag == self.content_tag:
+                self.content_depth += 1
+        elif "mw-parser-output" in classes and not (self.table_done and self._para_ready):
+            self.content_tag, self.content_depth = tag, 1
+            return
+        if self.stack:
+            self._table_start(tag, attrs, classes)
+        elif tag == "table" and self.content_depth and not self.table_done and "wikitable" in classes:
+            self.stack.append(("table", False))
+
+    def _table_start(self, tag, attrs, classes):
+        parent = self.stack[-1][0]
+        if tag == "table" or tag in _SPECIAL_TEXT_TAGS:
+            self.fail()
+        if tag == "tr":
+            if parent not in ("table", *_TABLE_PARTS):
+                self.fail()
+            self.row = ([], [])
+            self.rows.append(self.row)
+        elif tag in ("td", "th"):
+            if parent != "tr":
+                self.fail()
+            self.cell = CardCell(tag)
+            self.row[1].append(self.cell)
+        elif tag in _TABLE_PARTS:
+            if parent != "table":
+                self.fail()
+        elif parent in ("tr", *_TABLE_PARTS) or (parent == "table" and tag not in ("caption", "colgroup", "col")):
+            self.fail()
+        if tag == "img":
+            src = attrs.get("src", "")
+            if self.first_img is None:
+                self.first_img = src
+            if self.equip_img is None and "img-equip" in classes:
+                self.equip_img = src
+        if tag in _VOID_TAGS:
+            return
+        floated = self.cell is not None and "float:right" in attrs.get("style", "")
+        self.floated += floated
+        self.stack.append((tag, floated))
+
+    @property
+    def _para_ready(self) -> bool:
+        return not self.want_para or self.para_done
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if self.para_stack:
+            if self.para_stack.pop() != tag:
+                self.fail()
+            self.para_done = not self.para_stack
+        elif tag == "p" and self.content_depth and self.want_para and not self.para_done:
+            self.fail()           # 多余的 </p>：lxml 会补出一个空段落，html.parser 忽略
+        if self.h1_depth and tag == "h1":
+            self.h1_depth -= 1
+        if self.content_depth and tag == self.content_tag:
+            self.content_depth -= 1
+        if not self.stack:
+            if self.table_done and self.name_pieces is not None and not self.h1_depth and self._para_ready:
+                raise _StopScan
+            return
+        if tag in _VOID_TAGS:
+            self.fail()
+        top, floated = self.stack.pop()
+        if top != tag:
+            self.fail()
+        self.floated -= floated
+        if tag == "tr":
+            self.row = None
+        elif tag in ("td", "th"):
+            self.cell = None
+        if not self.stack:
+            self.table_done = True
+
+    @property
+    def table_text(self) -> str:
+        """信息卡整表文本，同 text_with_newlines(table)。"""
+        return _tidy_text("\n".join(self.table_pieces))
+
+    @property
+    def para_text(self) -> str | None:
+        """第一个段落的文字，同 p.get_text(" ", strip=True)；没有段落为 None。"""
+        return " ".join(self.para_pieces) if self.para_pieces is not None else None
+
+    @property
+    def icon_src(self) -> str:
+        # 同 download_icon_from_table：优先 img.img-equip，否则第一张图
+        return (self.equip_img if self.equip_img is not None else self.first_img) or ""
+
+def scan_info_card(html: str, want_para: bool = False) -> InfoCardScanner | None:
+    """流式扫描；结构自检不过（或缺标题/信息卡、段落没闭合）返回 None。"""
+    html = html_text(html)
+    sc = InfoCardScanner(want_para)
+    try:
+        sc.feed(html)
+        sc.close()
+    except _StopScan:
+        pass
+    if not sc.ok or sc.name_pieces is None or sc.h1_depth or not sc.table_done or sc.para_stack:
+        return None
+    return sc
+
+def _card_fp_weight_lines(sc: InfoCardScanner, rows: CardRows) -> tuple[str, str, list[str]]:
+    return _fp_weight_lines(sc.table_text, rows.left_lines())
+
+def _fast_card(html: str, category: str, *needles: str):
+    """常见版式自检：标题、信息卡齐全，且有同时含 needles 的表头行；否则 None。"""
+    sc = scan_info_card(html)
+    if sc is None:
+        return None
+    rows = CardRows(sc.rows, ROW_FIELDS.get(category, ()), ROW_HEADERS.get(category, ()))
+    if not any(all(n in t for n in needles) for t in rows.texts):
+        return None
+    data = {"category": category, "name": "".join(sc.name_pieces)}
+    data["icon_rel"] = download_icon(sc.icon_src, pathlib.Path("assets") / category / safe_filename(data["name"]))
+    return data, rows, _card_fp_weight_lines(sc, rows)
+
+def fast_parse_weapon(html: str) -> dict | None:
+    card = _fast_card(html, "weapons", "攻击力", "减伤率")
+    return _weapon_fields(*card) if card else None
+
+def fast_parse_armor(html: str) -> dict | None:
+    card = _fast_card(html, "armors", "减伤率", "抵抗力")
+    return _armor_fields(*card) if card else None
+
+def with_fast_path(category: str, fast, slow):
+    """先走快速通道，返回 None 就回退 slow；命中/回退计入 FAST_STATS。"""
+    def parse(html) -> dict:
+        if _fast:
+            html = html_text(html)      # 快速通道要 str；解一次码，回退时也用这份
+        data = fast(html) if _fast else None
+        if _fast:
+            with _fast_lock:
+                FAST_STATS.setdefault(category, [0, 0])[data is None] += 1
+        return data if data is not None else slow(html)
+    parse.__name__ = slow.__name__
+    parse.__doc__ = slow.__doc__
+    return parse
+
+
+PARSERS = {
+    "weapons": with_fast_path("weapons", fast_parse_weapon, parse_weapon),
+    "armors": with_fast_path("armors", fast_parse_armor, parse_armor),
+    "talismans": parse_talisman,
+    "items": parse_item,
+    "spells": parse_spell,
+    "ashes": parse_ash,
+}
+# 解析阶段计入运行统计，字节数按输入页面算
+PARSERS = {cat: staged("parse", lambda _data, html: len(html))(fn) for cat, fn in PARSERS.items()}
 
 
 # -------------------- 渲染：逐行 + 表格 --------------------
@@ -455,9 +2082,10 @@ def md_footer(source_url: str) -> str:
         f"> {source_url}\n"
     )
 
-def write_md_by_data(data: dict, source_url: str):
+@staged("write", lambda path, *_: file_size(path))
+def write_md_by_data(data: dict, source_url: str) -> pathlib.Path:
     """
-    根据解析结果写出单页 MD（按分类落目录）。
+    根据解析结果写出单页 MD（按分类落目录），返回写出的文件路径。
     """
     cat = data.get("category", "misc")
     name = data.get("name", "unknown")
@@ -542,7 +2170,9 @@ def write_md_by_data(data: dict, source_url: str):
 
     body.append(md_footer(source_url))
 
-    (root_md / f"{slug}.md").write_text("\n".join(body), encoding="utf-8")
+    path = root_md / f"{slug}.md"
+    path.write_text("\n".join(body), encoding="utf-8")
+    return path
 
 def append_index(cat: str, items: list[tuple[str, str]]):
     """更新分类 README 索引。"""
@@ -566,10 +2196,10 @@ def display_name(cat: str) -> str:
     }.get(cat, cat)
 
 def wipe_repo_except(keep: list[str]):
-    """清仓（保留 .github 与 scripts 可选）"""
+    """清仓（保留 .github 与 scripts 可选；.git 与本地缓存目录始终保留）"""
     root = pathlib.Path(".")
-    for p in root.iterdir():
-        if p.name in keep or p.name == ".git":
+    for p in list(root.iterdir()):
+        if p.name in keep or p.name == ".git" or p.resolve() == CACHE_DIR.resolve():
             continue
         if p.is_dir():
             import shutil
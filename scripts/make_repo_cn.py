@@ -9,10 +9,9 @@
   # 或自定义条目:
   python scripts/make_repo_cn.py --items 红露滴圣杯瓶,蓝露滴圣杯瓶,黄金种子
 """
-import argparse, pathlib, re, html, json
+import argparse, pathlib, re, sys, html, json
 from urllib.parse import quote
-import requests
-from bs4 import BeautifulSoup
+from lib_cn import CACHE_DIR, http_get, load_json, make_soup, mw_query_pages, save_json
 
 BASE = "https://wiki.biligame.com/eldenring"
 API  = f"{BASE}/api.php"
@@ -32,27 +31,71 @@ TYPE_LABEL = {
     "talismans": "护符",
 }
 
-def mw_parse_html(title: str) -> str:
-    """用 MediaWiki Action API 取渲染后的 HTML。"""
+def mw_parse_html(title: str, pageid: int = 0) -> str:
+    """用 MediaWiki Action API 取渲染后的 HTML；已知 pageid 时直接按 id 取，省掉服务端的标题解析。"""
     # 参考：MediaWiki Action API 'action=parse'（各站一般都启用）。 见官方文档。  # noqa
     # https://www.mediawiki.org/wiki/API/zh
-    r = requests.get(API, params={
-        "action": "parse",
-        "page": title,
-        "prop": "text|images",
-        "format": "json",
-    }, timeout=20)
+    params = {"action": "parse", "prop": "text|images", "format": "json"}
+    if pageid:
+        params["pageid"] = pageid
+    else:
+        params["page"] = title
+    r = http_get(API, params=params, timeout=20)
     r.raise_for_status()
     j = r.json()
     return j.get("parse", {}).get("text", {}).get("*", "")
 
+ITEM_TEXT_PAGE = "物品文本"
+ITEM_TEXT_CACHE = CACHE_DIR / "item_text_index.json"
+_item_text_index = None
+
+def build_item_text_index(text_html: str) -> dict:
+    """把「物品文本」总表一次性解析成 {标题: 说明}；同名链接以页面里第一次出现的为准。"""
+    tsoup = make_soup(text_html)
+    index, seen = {}, set()
+    for link in tsoup.find_all("a"):
+        title = link.string
+        if title is None or str(title) in seen:
+            continue
+        seen.add(str(title))
+        # 找到链接后的若干段落/列表
+        for sib in link.parent.next_siblings:
+            if getattr(sib, "name", "") in ("h2", "h3", "ul", "ol"):
+                # 抓到第一个 ul/ol 的文本或下一个小标题前的文本
+                txt = sib.get_text("\n", strip=True)
+                if txt:
+                    index[str(title)] = txt
+                    break
+    return index
+
+def item_text_index() -> dict:
+    """
+    本次运行内只解析一次「物品文本」；结果连同该页 revid 落到 .cache，
+    下次运行 revid 没变就直接读盘，不再下载那张几 MB 的大页。
+    """
+    global _item_text_index
+    if _item_text_index is not None:
+        return _item_text_index
+    cached = load_json(ITEM_TEXT_CACHE, {})
+    try:
+        revid = mw_query_pages([ITEM_TEXT_PAGE]).get(ITEM_TEXT_PAGE, {}).get("revid", 0)
+    except Exception:
+        revid = cached.get("revid", 0)   # 查不到修订号时，有旧索引就先用着
+    if cached.get("index") is not None and revid and cached.get("revid") == revid:
+        _item_text_index = cached["index"]
+    else:
+        _item_text_index = build_item_text_index(mw_parse_html(ITEM_TEXT_PAGE))
+        if revid:
+            save_json(ITEM_TEXT_CACHE, {"revid": revid, "index": _item_text_index})
+    return _item_text_index
+
 def extract_image_and_desc(html_text: str, title: str):
     """从 HTML 中尽量抽取 第一张图 + 物品说明段落（多策略，尽量接近你截图里的文案）。"""
     img_url, desc = "", ""
     if not html_text:
         return img_url, desc
 
-    soup = BeautifulSoup(html_text, "html.parser")
+    soup = make_soup(html_text)
     # 1) 图：页面第一张 img（常为物品图标/立绘）
     img = soup.select_one(".mw-parser-output img") or soup.select_one("img")
     if img and img.get("src"):
@@ -84,20 +127,9 @@ def extract_image_and_desc(html_text: str, title: str):
     if paragraphs:
         desc = "\n\n".join(paragraphs)
 
-    # 3) 回退：如果该单页结构怪导致 desc 为空，则去「物品文本」总表里按标题搜索下一段文字
+    # 3) 回退：如果该单页结构怪导致 desc 为空，则去「物品文本」总表里按标题查说明
     if not desc:
-        text_html = mw_parse_html("物品文本")
-        tsoup = BeautifulSoup(text_html, "html.parser")
-        link = tsoup.find("a", string=title)
-        if link:
-            # 找到链接后的若干段落/列表
-            for sib in link.parent.next_siblings:
-                if getattr(sib, "name", "") in ("h2", "h3", "ul", "ol"):
-                    # 抓到第一个 ul/ol 的文本或下一个小标题前的文本
-                    txt = sib.get_text("\n", strip=True)
-                    if txt:
-                        desc = txt
-                        break
+        desc = item_text_index().get(title, "")
 
     # 清洗与裁剪
     desc = re.sub(r"\s+\n", "\n", desc or "").strip()
@@ -173,10 +205,27 @@ def main():
     else:
         targets = SAMPLES[:]
 
+    # 先批量 action=query 解析规范标题 / pageid / revid：不存在的页不再单独 parse，
+    # 重定向到同一页面的多个名字只 parse 一次
+    try:
+        pages = mw_query_pages([t for _, t, _ in targets])
+    except Exception as e:
+        sys.stderr.write(f"[warn] 批量查询失败，逐条解析：{e}\n")
+        pages = {}
+
+    parsed = {}   # pageid（或标题）-> (img, desc)
     written = []
     for folder, title, filename in targets:
-        html_text = mw_parse_html(title)
-        img, desc = extract_image_and_desc(html_text, title)
+        page = pages.get(title, {})
+        if page.get("missing"):
+            sys.stderr.write(f"[warn] 页面不存在：{title}\n")
+            img, desc = "", ""
+        else:
+            key = page.get("pageid") or title
+            if key not in parsed:
+                html_text = mw_parse_html(page.get("title", title), page.get("pageid", 0))
+                parsed[key] = extract_image_and_desc(html_text, title)
+            img, desc = parsed[key]
         if not desc:
             desc = "（未从页面解析到正文，稍后完善）"
         write_md(root, folder, title, filename, img, desc)
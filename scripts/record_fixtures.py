@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+录制离线样本页：六个分类各取目录页前 N 条，把原始正文字节 gzip 存到 fixtures/<分类>/，
+并写 fixtures/manifest.json（标题、URL、编码、字节数）。供 bench_corpus.py 离线计时，
+也可以直接喂给 check_parsers.py / bench_parsers.py（<分类>:fixtures/<分类>/xxx.html.gz）。
+
+用法:
+  python scripts/record_fixtures.py                 # 每类 5 条（走 HTTP 缓存）
+  python scripts/record_fixtures.py --per 10 --out fixtures
+页面改版后重新录制即可；文件内容不带时间戳，重录未变的页面不会产生 diff。
+依赖: requests, beautifulsoup4
+"""
+import argparse
+import gzip
+import pathlib
+
+import lib_cn
+from fetch_samples_all_categories import INDEX, pick_first_unique
+
+FIXTURE_DIR = pathlib.Path("fixtures")
+MANIFEST = "manifest.json"
+
+
+def record(cat: str, per: int, out: pathlib.Path) -> list[dict]:
+    entries = []
+    cat_dir = out / cat
+    lib_cn.ensure_dir(cat_dir)
+    for _name, url, title in pick_first_unique(INDEX[cat], per):
+        try:
+            page = lib_cn.get_page(url)
+        except Exception as e:
+            print(f"[warn] {cat} {title}: {e}")
+            continue
+        rel = f"{cat}/{lib_cn.safe_filename(title)}.html.gz"
+        (out / rel).write_bytes(gzip.compress(bytes(page), mtime=0))
+        entries.append({"title": title, "url": url, "file": rel, "encoding": page.encoding, "bytes": len(page)})
+        print(f"[info] {cat} {title} ({len(page)} B)")
+    return entries
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--per", type=int, default=5, help="每类录几条")
+    ap.add_argument("--out", default=str(FIXTURE_DIR), help="样本目录")
+    args = ap.parse_args()
+
+    out = pathlib.Path(args.out)
+    manifest = {cat: record(cat, args.per, out) for cat in INDEX}
+    lib_cn.save_json(out / MANIFEST, manifest)
+    print(f"[done] {sum(map(len, manifest.values()))} 页 → {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,32 +5,13 @@
 
 import json, re, sys, time, pathlib
 from urllib.parse import urljoin, urlparse, parse_qs, unquote
-import requests
-from bs4 import BeautifulSoup
+from lib_cn import get_html, iter_content_links, make_page_soup, text_with_newlines
 
 INDEX_URL = "https://wiki.biligame.com/eldenring/%E6%AD%A6%E5%99%A8%E4%B8%80%E8%A7%88"
 LIMIT = 3
 DELAY = 0.8
-HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) ER-Items-Fetch/1.0"}
 BAD_PREFIXES = ("特殊:", "分类:", "Category:", "模板", "Template:", "文件:", "File:", "MediaWiki:", "帮助:", "Help:")
 
-def get_html(url: str, timeout: float = 25.0) -> str:
-    r = requests.get(url, headers=HEADERS, timeout=timeout); r.raise_for_status()
-    if not r.encoding or r.encoding.lower() == "iso-8859-1":
-        r.encoding = r.apparent_encoding or "utf-8"
-    return r.text
-
-def soup_of(url: str) -> BeautifulSoup:
-    return BeautifulSoup(get_html(url), "html.parser")
-
-def text_with_newlines(tag) -> str:
-    if tag is None: return ""
-    for br in tag.find_all("br"): br.replace_with("\n")
-    txt = tag.get_text("\n", strip=True)
-    txt = re.sub(r"[ \t]+", " ", txt)
-    txt = re.sub(r"\n{3,}", "\n\n", txt).strip()
-    return txt
-
 def pair_by_sequence(strings):
     out, it = {}, iter(strings)
     for k in it:
@@ -39,7 +20,7 @@ def pair_by_sequence(strings):
     return out
 
 def parse_item_html(html: str) -> dict:
-    soup = BeautifulSoup(html, "html.parser"); data = {}
+    soup = make_page_soup(html); data = {}
     h1 = soup.select_one("h1.firstHeading")
     data["name"] = h1.get_text(strip=True) if h1 else ""
     table = soup.select_one(".mw-parser-output table.wikitable")
@@ -134,12 +115,10 @@ def is_item_link(href: str) -> bool:
 
 def pick_first_n_items(index_url: str, n: int = 3):
     base = "{u.scheme}://{u.netloc}".format(u=urlparse(index_url))
-    soup = soup_of(index_url)
-    content = soup.select_one("#mw-content-text .mw-parser-output") or soup.select_one(".mw-parser-output") or soup
     found, seen = [], set()
-    for a in content.find_all("a", href=True):
-        if is_item_link(a["href"]):
-            url = urljoin(base, a["href"]); name = a.get_text(strip=True) or url
+    for href, text in iter_content_links(get_html(index_url)):   # 流式解析，拿够 n 条即停
+        if is_item_link(href):
+            url = urljoin(base, href); name = text or url
             if (name,url) in seen: continue
             seen.add((name,url)); found.append((name,url))
             if len(found) >= n: break